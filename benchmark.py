@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+import export_model
+import generate_mock_data
+import predict
+import train_model
+
+def make_sample_records(num_rows, seed=42):
+    """Builds a batch of synthetic quote records in the format accepted by predict_new_project."""
+    rng = np.random.default_rng(seed)
+    project_types = ['软件开发', '系统集成', '硬件采购', '咨询服务', '市场推广']
+    quoted_hours = rng.uniform(50, 2000, num_rows).round(2)
+    return pd.DataFrame({
+        'quoted_hours': quoted_hours,
+        'quoted_price': (quoted_hours * rng.uniform(100, 200, num_rows) / 10000).round(2),
+        'actual_contract_hours': 0,
+        'actual_contract_price': 0,
+        'function_points': rng.integers(0, 500, num_rows),
+        'interface_count': rng.integers(0, 50, num_rows),
+        'demand_stability_rating': rng.uniform(1, 5, num_rows).round(1),
+        'team_size': rng.integers(2, 20, num_rows),
+        'delivery_quality_score': 0,
+        'user_satisfaction_score': 0,
+        'project_duration_days': rng.integers(30, 365, num_rows),
+        'num_technologies': rng.integers(0, 6, num_rows),
+        'project_type': rng.choice(project_types, num_rows),
+    })
+
+def bench_predict(num_rows=20000, num_single_rows=200):
+    """
+    Compares rows/sec of the per-dict predict_new_project path against predict_batch.
+    The per-dict path is only run on a subset of rows since it is very slow.
+    """
+    print(f"--- Prediction benchmark ({num_rows} rows) ---")
+    records_df = make_sample_records(num_rows)
+    records = records_df.to_dict(orient='records')
+
+    # 1. Per-record path: one call per record (the models stay loaded between calls)
+    start = time.perf_counter()
+    for record in records[:num_single_rows]:
+        predict.predict_new_project(record)
+    single_elapsed = time.perf_counter() - start
+    single_rate = num_single_rows / single_elapsed
+
+    # 2. Batch path with the models loaded once
+    hours_model, cost_model = predict.load_models()
+    start = time.perf_counter()
+    predict.predict_batch(records, hours_model, cost_model)
+    batch_elapsed = time.perf_counter() - start
+    batch_rate = num_rows / batch_elapsed
+
+    print(f"predict_new_project: {single_rate:,.0f} rows/sec ({num_single_rows} rows in {single_elapsed:.2f}s)")
+    print(f"predict_batch:       {batch_rate:,.0f} rows/sec ({num_rows} rows in {batch_elapsed:.2f}s)")
+    print(f"Speedup: {batch_rate / single_rate:,.1f}x")
+    return {'single_rows_per_sec': single_rate, 'batch_rows_per_sec': batch_rate}
+
+def bench_training(data_path="./processed_modeling_data.csv", num_rows=20000, repeats=20):
+    """
+    Compares training wall-clock time and inference latency of the two-model setup,
+    the shared QuantileDMatrix setup and the single multi-output model.
+    """
+    print("--- Training benchmark: separate vs shared vs multi-output ---")
+    records_df = make_sample_records(num_rows)
+    results = {}
+    with tempfile.TemporaryDirectory() as model_dir:
+        results['separate'] = train_model.train(data_path, model_dir)
+        results['shared'] = train_model.train_shared(False, data_path, model_dir)
+        results['multi'] = train_model.train_shared(True, data_path, model_dir)
+        hours_model, cost_model = predict.load_models(model_dir)
+        multi_model = predict.load_multi_model(model_dir)
+        vendor_stats = predict.load_vendor_stats()
+
+        # "shared" writes the same kind of models as "separate", so they only need timing once
+        latencies = {}
+        for name, score in [('two models', lambda: predict.predict_batch(records_df, hours_model, cost_model, vendor_stats=vendor_stats)),
+                            ('multi-output', lambda: predict.predict_batch_multi(records_df, multi_model, vendor_stats=vendor_stats))]:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                score()
+            latencies[name] = (time.perf_counter() - start) / repeats
+
+    for mode, result in results.items():
+        print(f"{mode:>8}: train {result['train_seconds']:.3f}s, MAE hours {result['mae_hours']:.2f}, MAE cost {result['mae_cost']:.2f}")
+    for name, seconds in latencies.items():
+        print(f"{name:>12}: {seconds * 1000:.2f} ms per {num_rows}-row batch")
+    return {'training': results, 'inference_seconds': latencies}
+
+def _measure(load):
+    """Runs load() and returns (seconds, peak traced memory in MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 ** 2
+
+def bench_storage(sizes=(1_000_000, 10_000_000), data_path="./processed_modeling_data.csv"):
+    """
+    Compares load time and peak memory of the processed data in CSV, Parquet and the
+    memory-mapped .npy feature matrix. The processed data is tiled up to each size.
+    """
+    print("--- Storage benchmark: CSV vs Parquet vs memory-mapped .npy ---")
+    try:
+        base_df = pd.read_csv(data_path)
+    except FileNotFoundError:
+        print(f"Error: Processed data file not found at {data_path}. Please run data_processor.py first.")
+        return None
+
+    results = []
+    for num_rows in sizes:
+        df = base_df.iloc[np.resize(np.arange(len(base_df)), num_rows)].reset_index(drop=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'processed_modeling_data.csv')
+            matrix_dir = os.path.join(tmp_dir, 'matrix')
+            df.to_csv(csv_path, index=False)
+            data_processor.save_processed(df, matrix_dir)
+            del df
+
+            loaders = {
+                'csv': lambda: data_processor.select_features(pd.read_csv(csv_path)).to_numpy(),
+                'parquet': lambda: data_processor.select_features(pd.read_parquet(os.path.join(matrix_dir, 'data.parquet'))).to_numpy(),
+                # Touch every value so the page cache cost is included
+                'npy (mmap)': lambda: data_processor.load_feature_matrix(matrix_dir)[0].sum(),
+            }
+            sizes_mb = {
+                'csv': os.path.getsize(csv_path) / 1024 ** 2,
+                'parquet': os.path.getsize(os.path.join(matrix_dir, 'data.parquet')) / 1024 ** 2,
+                'npy (mmap)': os.path.getsize(os.path.join(matrix_dir, 'features.npy')) / 1024 ** 2,
+            }
+            for fmt, load in loaders.items():
+                seconds, peak_mb = _measure(load)
+                results.append({'rows': num_rows, 'format': fmt, 'load_seconds': seconds, 'peak_mb': peak_mb, 'file_mb': sizes_mb[fmt]})
+                print(f"{num_rows:>11,} rows | {fmt:<10} | load {seconds:7.2f}s | peak memory {peak_mb:9.1f} MB | file {sizes_mb[fmt]:9.1f} MB")
+    return results
+
+def make_merged_quotes(num_quotes, quotes_per_project=3, nan_fraction=0.05, seed=42):
+    """Builds the columns of a merged quote frame that the tech stack and imputation steps use."""
+    rng = np.random.default_rng(seed)
+    num_projects = max(num_quotes // quotes_per_project, 1)
+    stacks = np.array([
+        json.dumps(rng.choice(data_processor.TECH_STACK_OPTIONS, rng.integers(0, 7), replace=False).tolist())
+        for _ in range(num_projects)
+    ], dtype=object)
+    project_index = rng.integers(0, num_projects, num_quotes)
+
+    df = pd.DataFrame({'technology_stack': stacks[project_index]})
+    for col in ['quoted_hours', 'quoted_price', 'actual_contract_hours', 'actual_contract_price',
+                'function_points', 'interface_count', 'team_size', 'demand_stability_rating']:
+        values = rng.uniform(0, 1000, num_quotes)
+        values[rng.random(num_quotes) < nan_fraction] = np.nan
+        df[col] = values
+    return df
+
+def _legacy_tech_and_imputation(df):
+    """The per-row apply and per-column fillna loop that feature_engineering used before."""
+    def parse_tech_stack(stack_str):
+        try:
+            return json.loads(stack_str)
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    df['tech_stack_list'] = df['technology_stack'].apply(parse_tech_stack)
+    df['num_technologies'] = df['tech_stack_list'].apply(len)
+    for col in df.select_dtypes(include=np.number).columns:
+        if df[col].isnull().any():
+            df[col] = df[col].fillna(df[col].median())
+    return df
+
+def _vectorized_tech_and_imputation(df):
+    num_technologies, tech_columns = data_processor.encode_tech_stack(df['technology_stack'])
+    df['num_technologies'] = num_technologies
+    df = pd.concat([df, tech_columns], axis=1)
+    return data_processor.impute_medians(df)
+
+def bench_feature_engineering(num_quotes=1_000_000):
+    """
+    Compares the tech stack parsing and median imputation steps of feature_engineering
+    against the previous row-by-row implementation.
+    """
+    print(f"--- Feature engineering benchmark ({num_quotes:,} quotes) ---")
+    df = make_merged_quotes(num_quotes)
+    timings = {}
+    for name, step in [('legacy apply', _legacy_tech_and_imputation), ('vectorized', _vectorized_tech_and_imputation)]:
+        frame = df.copy()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            step(frame)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:>12}: {timings[name]:.2f}s")
+    print(f"Speedup: {timings['legacy apply'] / timings['vectorized']:.1f}x")
+    return timings
+
+def bench_native(num_single=2000, num_rows=100_000, tolerance=1e-4):
+    """
+    Compares the pickled XGBRegressor path with the exported boosters scored by
+    FastPredictor: p50/p99 single-row latency, batch throughput, and whether the
+    predictions match within tolerance.
+    """
+    print("--- Native inference benchmark: pickle vs exported booster ---")
+    hours_model, cost_model = predict.load_models()
+    if hours_model is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_model.export_models(".", export_dir)
+        fast = export_model.FastPredictor(export_dir)
+
+    feature_names = hours_model.get_booster().feature_names
+    X = predict.prepare_features(make_sample_records(num_rows), feature_names)
+    X_df = pd.DataFrame(X, columns=feature_names)
+
+    def pickle_path(i, j):
+        rows = X_df.iloc[i:j]
+        return hours_model.predict(rows), cost_model.predict(rows)
+
+    def native_path(i, j):
+        return fast.predict(X[i:j])
+
+    results = {}
+    for name, score in [('pickle', pickle_path), ('native', native_path)]:
+        latencies = []
+        for i in range(num_single):
+            start = time.perf_counter()
+            score(i, i + 1)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hours, cost = score(0, num_rows)
+        batch_seconds = time.perf_counter() - start
+        results[name] = {
+            'p50_ms': np.percentile(latencies, 50) * 1000,
+            'p99_ms': np.percentile(latencies, 99) * 1000,
+            'batch_rows_per_sec': num_rows / batch_seconds,
+            'predictions': (hours, cost),
+        }
+        print(f"{name:>7}: single-row p50 {results[name]['p50_ms']:.3f} ms, p99 {results[name]['p99_ms']:.3f} ms, "
+              f"batch {results[name]['batch_rows_per_sec']:,.0f} rows/sec")
+
+    matches = all(np.allclose(a, b, rtol=tolerance, atol=tolerance)
+                  for a, b in zip(results['pickle'].pop('predictions'), results['native'].pop('predictions')))
+    print(f"Predictions match within {tolerance}: {matches}")
+    results['predictions_match'] = matches
+    return results
+
+def _legacy_load_data(data_path):
+    """load_data before the concurrent, column-pruned reader: every column of every file, one after another."""
+    return tuple(pd.read_csv(os.path.join(data_path, f"{name}.csv")) for name in data_processor.SOURCE_COLUMNS)
+
+def _load_in_fresh_process(variant, data_path):
+    """Runs one loader and returns (seconds, peak RSS above the baseline in MB, loaded frames)."""
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    frames = _legacy_load_data(data_path) if variant == 'legacy' else data_processor.load_data(data_path)
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_mb
+    return seconds, peak_mb, frames
+
+def bench_load(data_path="./benchmark_data/quotes_1000000_seed42"):
+    """
+    Compares load time and peak memory of the sequential, all-columns reader with
+    load_data, and checks that the processed data comes out the same. Each loader
+    runs in a fresh process so the peak RSS (which includes the parser's own
+    buffers, unlike tracemalloc) is not shared. The default dataset is the 1M
+    quote one written by benchmark_suite.py.
+    """
+    print(f"--- Load benchmark: sequential full read vs load_data ({data_path}) ---")
+    if not os.path.exists(os.path.join(data_path, 'quotes.csv')):
+        print(f"Error: No dataset at {data_path}. Run benchmark_suite.py (or pass a directory with the CSV files).")
+        return None
+
+    results, processed = {}, {}
+    for variant in ('legacy', 'load_data'):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            seconds, peak_mb, (projects, _, quotes, actuals) = executor.submit(_load_in_fresh_process, variant, data_path).result()
+        results[variant] = {'seconds': seconds, 'peak_rss_mb': peak_mb}
+        processed[variant] = data_processor.feature_engineering(data_processor.merge_data(projects, quotes, actuals))
+        print(f"{variant:>10}: {seconds:6.2f}s, peak RSS +{peak_mb:,.0f} MB")
+
+    legacy, current = processed['legacy'], processed['load_data']
+    same = legacy.columns.equals(current.columns) and all(
+        legacy[col].astype(str).equals(current[col].astype(str)) for col in legacy.columns)
+    print(f"Speedup: {results['legacy']['seconds'] / results['load_data']['seconds']:.1f}x, "
+          f"memory: {results['legacy']['peak_rss_mb'] / max(results['load_data']['peak_rss_mb'], 1):.1f}x less. "
+          f"Same processed data: {same}")
+    results['same_output'] = same
+    return results
+
+def _legacy_merge_data(projects_df, quotes_df, actuals_df):
+    """merge_data before the indexed gather: isin filter, copy, two pd.merge calls, drop and rename."""
+    completed_project_ids = actuals_df['project_id'].unique()
+    training_quotes_df = quotes_df[quotes_df['project_id'].isin(completed_project_ids)].copy()
+    merged_df = pd.merge(training_quotes_df, projects_df, left_on='project_id', right_on='id', suffixes=('_quote', '_project'))
+    final_df = pd.merge(merged_df, actuals_df, on='project_id', suffixes=('', '_actual'))
+    final_df = final_df.drop(columns=['id_project'])
+    final_df.rename(columns={'id_quote': 'quote_id', 'id': 'actual_id'}, inplace=True)
+    return final_df
+
+def bench_merge(num_projects=1_000_000, seed=42):
+    """
+    Compares time and peak memory of the pd.merge based merge_data with the indexed
+    gather, for all columns and for only the columns feature_engineering and the
+    model features need, and checks that both produce the same frame.
+    """
+    print(f"--- Merge benchmark: pd.merge vs indexed gather ({num_projects:,} projects) ---")
+    vendor_ids = np.arange(1, generate_mock_data.NUM_VENDORS + 1)
+    projects, quotes, actuals = generate_mock_data.generate_chunk(0, 1, num_projects, vendor_ids, seed)
+    print(f"{len(quotes):,} quotes, {len(actuals):,} actuals")
+
+    reference = _legacy_merge_data(projects, quotes, actuals)
+    needed = [col for col in reference.columns if col not in ('contract_date', 'payment_terms', 'status')]
+    variants = {
+        'pd.merge': lambda: _legacy_merge_data(projects, quotes, actuals),
+        'indexed': lambda: data_processor.merge_data(projects, quotes, actuals),
+        'indexed, needed columns': lambda: data_processor.merge_data(projects, quotes, actuals, columns=needed),
+    }
+    results = {}
+    for name, merge in variants.items():
+        seconds, peak_mb = _measure(merge)
+        results[name] = {'seconds': seconds, 'peak_mb': peak_mb}
+        print(f"{name:>24}: {seconds:6.2f}s, peak memory {peak_mb:8.1f} MB")
+
+    merged = data_processor.merge_data(projects, quotes, actuals)
+    same = reference.columns.equals(merged.columns) and reference.sort_values('quote_id', ignore_index=True).equals(merged)
+    print(f"Speedup: {results['pd.merge']['seconds'] / results['indexed']['seconds']:.1f}x, "
+          f"memory: {results['pd.merge']['peak_mb'] / results['indexed']['peak_mb']:.1f}x less. Same merged data: {same}")
+    results['same_output'] = same
+    return results
+
+BENCHMARKS = {
+    'predict': bench_predict,
+    'training': bench_training,
+    'storage': bench_storage,
+    'feature_engineering': bench_feature_engineering,
+    'native': bench_native,
+    'load': bench_load,
+    'merge': bench_merge,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the performance benchmarks.")
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all).")
+    args = parser.parse_args()
+
+    for name in args.benchmarks or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+        BENCHMARKS[name]()
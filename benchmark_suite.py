@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+import data_processor
+import predict
+from generate_mock_data import MAX_QUOTES_PER_PROJECT, NUM_VENDORS, generate_dataset
+from train_model import XGB_PARAMS
+
+# Dataset sizes in quotes, and the n_jobs values training is timed with (-1 = all cores)
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+N_JOBS = (1, 2, 4, -1)
+DATA_DIR = "./benchmark_data"
+REPORT_NAME = "benchmark_report"
+# A step is a regression if it is this much slower than the baseline, and by at
+# least MIN_REGRESSION_SECONDS (so timer noise on tiny steps is ignored)
+REGRESSION_TOLERANCE = 0.2
+MIN_REGRESSION_SECONDS = 0.05
+
+def ensure_dataset(num_quotes, seed=42, workers=None):
+    """
+    Generates a mock dataset of about num_quotes quotes in DATA_DIR, unless it was
+    generated before. The generator is deterministic for a seed, so every run and
+    every version of the scripts is measured on the same data.
+
+    Returns:
+        str: The dataset directory.
+    """
+    path = os.path.join(DATA_DIR, f"quotes_{num_quotes}_seed{seed}")
+    if os.path.isdir(path):
+        return path
+
+    # Projects get 1 to MAX_QUOTES_PER_PROJECT quotes, (MAX_QUOTES_PER_PROJECT + 1) / 2 on average
+    num_projects = max(1, round(num_quotes * 2 / (MAX_QUOTES_PER_PROJECT + 1)))
+    print(f"Generating a dataset of ~{num_quotes:,} quotes ({num_projects:,} projects) in {path}...")
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    generate_dataset(num_projects, NUM_VENDORS, seed, out_dir=tmp_path, workers=workers or os.cpu_count())
+    # Renamed only once complete, so an interrupted generation is not reused
+    os.replace(tmp_path, path)
+    return path
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def run_pipeline(data_path, n_jobs_values=N_JOBS):
+    """
+    Runs load -> merge -> feature engineering -> training -> batch prediction once
+    on a dataset and times every step. Training fits both models for each n_jobs
+    value; prediction uses the models trained with the last one.
+
+    Returns:
+        list: One dict per step with its rows, seconds and n_jobs.
+    """
+    results = []
+
+    def record(step, seconds, rows, n_jobs=None):
+        results.append({'step': step, 'n_jobs': n_jobs, 'rows': rows, 'seconds': seconds})
+        label = step if n_jobs is None else f"{step} (n_jobs={n_jobs})"
+        print(f"  {label:<24} {seconds:9.3f}s  {rows / seconds:>14,.0f} rows/sec")
+
+    (projects, _, quotes, actuals), seconds = _timed(data_processor.load_data, data_path)
+    record('load_data', seconds, len(quotes))
+    merged, seconds = _timed(data_processor.merge_data, projects, quotes, actuals)
+    record('merge_data', seconds, len(merged))
+    del projects, quotes, actuals
+    processed, seconds = _timed(data_processor.feature_engineering, merged)
+    record('feature_engineering', seconds, len(processed))
+    del merged
+
+    features = data_processor.select_features(processed)
+    for n_jobs in n_jobs_values:
+        models = []
+        start = time.perf_counter()
+        for target in data_processor.TARGET_COLUMNS:
+            model = xgb.XGBRegressor(**{**XGB_PARAMS, 'n_jobs': n_jobs})
+            model.fit(features, processed[target])
+            models.append(model)
+        record('train', time.perf_counter() - start, len(features), n_jobs)
+
+    (hours, _), seconds = _timed(predict.predict_batch, processed, *models)
+    record('predict_batch', seconds, len(hours))
+    return results
+
+def run_suite(sizes=SIZES, n_jobs_values=N_JOBS, seed=42, repeats=1):
+    """
+    Runs the pipeline on a dataset of every size. With repeats > 1 the fastest
+    time of each step is kept.
+
+    Returns:
+        pd.DataFrame: One row per (size, step, n_jobs).
+    """
+    # n_jobs=-1 is all cores, which may equal one of the other values
+    n_jobs_values = list(dict.fromkeys(os.cpu_count() if n_jobs == -1 else n_jobs for n_jobs in n_jobs_values))
+    frames = []
+    for size in sizes:
+        data_path = ensure_dataset(size, seed)
+        for repeat in range(repeats):
+            print(f"--- {size:,} quotes, run {repeat + 1}/{repeats} ---")
+            frames.append(pd.DataFrame(run_pipeline(data_path, n_jobs_values)).assign(size=size))
+
+    results = pd.concat(frames, ignore_index=True)
+    results['n_jobs'] = results['n_jobs'].astype('Int64')
+    results = (results.groupby(['size', 'step', 'n_jobs'], dropna=False, sort=False)
+               .agg(rows=('rows', 'first'), seconds=('seconds', 'min')).reset_index())
+    results['rows_per_sec'] = results['rows'] / results['seconds']
+    return results
+
+def environment():
+    """The versions and hardware a report was produced with."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'xgboost': xgb.__version__,
+        'cpu_count': os.cpu_count(),
+        'platform': platform.platform(),
+    }
+
+def write_report(results, out_dir="."):
+    """Writes the results to <REPORT_NAME>.csv and .json (with the environment). Returns the JSON path."""
+    os.makedirs(out_dir, exist_ok=True)
+    results.to_csv(os.path.join(out_dir, f"{REPORT_NAME}.csv"), index=False)
+    json_path = os.path.join(out_dir, f"{REPORT_NAME}.json")
+    with open(json_path, 'w') as f:
+        json.dump({'environment': environment(), 'results': json.loads(results.to_json(orient='records'))}, f, indent=2)
+    return json_path
+
+def plot_report(results, path):
+    """Plots time vs data size for every step, and the training speedup vs n_jobs for every size."""
+    fig, (ax_size, ax_cores) = plt.subplots(1, 2, figsize=(14, 5))
+
+    all_cores = results['n_jobs'].max()
+    for step, group in results.groupby('step', sort=False):
+        if step == 'train':
+            group = group[group['n_jobs'] == all_cores]
+            step = f"train (n_jobs={all_cores})"
+        ax_size.plot(group['size'], group['seconds'], marker='o', label=step)
+    ax_size.set(xscale='log', yscale='log', xlabel='Quotes', ylabel='Seconds', title='Time by data size')
+    ax_size.legend()
+
+    training = results[results['step'] == 'train']
+    for size, group in training.groupby('size'):
+        group = group.sort_values('n_jobs')
+        ax_cores.plot(group['n_jobs'], group['seconds'].iloc[0] / group['seconds'], marker='o', label=f"{size:,} quotes")
+    cores = sorted(training['n_jobs'].unique())
+    ax_cores.plot(cores, np.array(cores) / cores[0], linestyle='--', color='grey', label='linear')
+    ax_cores.set(xlabel='n_jobs', ylabel=f"Speedup over n_jobs={cores[0]}", title='Training scaling with cores')
+    ax_cores.legend()
+
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def compare_to_baseline(results, baseline_path, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares the results with a report written by an earlier version of the scripts.
+
+    Returns:
+        pd.DataFrame: The steps that got slower by more than tolerance (and MIN_REGRESSION_SECONDS).
+    """
+    with open(baseline_path) as f:
+        baseline = pd.DataFrame(json.load(f)['results'])
+    baseline['n_jobs'] = baseline['n_jobs'].astype('Int64')
+    merged = results.merge(baseline[['size', 'step', 'n_jobs', 'seconds']], on=['size', 'step', 'n_jobs'],
+                           suffixes=('', '_baseline'))
+    merged['ratio'] = merged['seconds'] / merged['seconds_baseline']
+    slower = ((merged['ratio'] > 1 + tolerance)
+              & (merged['seconds'] - merged['seconds_baseline'] > MIN_REGRESSION_SECONDS))
+
+    print(f"--- Comparison with {baseline_path} ---")
+    for row in merged.itertuples():
+        label = row.step if pd.isna(row.n_jobs) else f"{row.step} (n_jobs={row.n_jobs})"
+        flag = "  REGRESSION" if slower[row.Index] else ""
+        print(f"{row.size:>11,} | {label:<24} | {row.seconds_baseline:9.3f}s -> {row.seconds:9.3f}s ({row.ratio:5.2f}x){flag}")
+    return merged[slower]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times the whole pipeline on generated datasets of increasing size.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Dataset sizes in quotes.")
+    parser.add_argument('--n-jobs', type=int, nargs='+', default=list(N_JOBS), help="n_jobs values to train with (-1 = all cores).")
+    parser.add_argument('--repeats', type=int, default=1, help="Runs per size; the fastest time of each step is kept.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out-dir', default=".", help="Where to write the report and the plot.")
+    parser.add_argument('--baseline', help="A benchmark_report.json from an earlier version to check for regressions.")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE, help="Allowed slowdown against the baseline.")
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.n_jobs, args.seed, args.repeats)
+    json_path = write_report(report, args.out_dir)
+    plot_path = os.path.join(args.out_dir, f"{REPORT_NAME}.png")
+    plot_report(report, plot_path)
+    print(f"Report saved to {json_path} and {REPORT_NAME}.csv, scaling curves to {plot_path}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(report, args.baseline, args.tolerance)
+        if len(regressions):
+            print(f"{len(regressions)} step(s) regressed by more than {args.tolerance:.0%}.")
+            raise SystemExit(1)
+        print("No regressions.")
@@ -0,0 +1,187 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+import predict
+
+logger = logging.getLogger(__name__)
+
+# Projects whose quotes are re-scored
+OPEN_STATUSES = ['in_progress', 'planning']
+CHUNK_ROWS = data_processor.QUOTES_CHUNK_ROWS # Quotes read (and scored) per chunk
+OUTPUT_FILE = "./quote_scores.csv"
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+# Per-worker state built once by _init_worker: the open projects, the models and their pipeline
+_WORKER = {}
+
+def _init_worker(data_path, model_dir, nthread):
+    """
+    Loads the open projects, the vendor aggregates, both models and their pipeline once
+    per worker. Missing values are imputed with the medians fitted with the models (the
+    pipeline's, or imputation_medians.json in model_dir for models trained without one).
+    """
+    columns = data_processor.SOURCE_COLUMNS['projects']
+    projects = pd.read_csv(os.path.join(data_path, 'projects.csv'), usecols=list(columns), dtype=columns)
+    hours_model, cost_model = predict.load_models(model_dir)
+    if hours_model is None:
+        raise FileNotFoundError(f"No models found in {model_dir}")
+    for model in (hours_model, cost_model):
+        model.get_booster().set_param({'nthread': nthread})
+    pipeline = predict.load_pipeline(model_dir)
+    if pipeline is not None:
+        medians = pipeline.medians
+    else:
+        medians = data_processor.load_medians(os.path.join(model_dir, os.path.basename(data_processor.MEDIANS_FILE)))
+    _WORKER.update({
+        'projects': projects[projects['status'].isin(OPEN_STATUSES)].reset_index(drop=True),
+        'medians': medians,
+        'vendor_stats': predict.load_vendor_stats(),
+        'hours_model': hours_model,
+        'cost_model': cost_model,
+        'pipeline': pipeline,
+    })
+
+def score_chunk(quotes_df):
+    """
+    Runs the data_processor merge and feature steps on one chunk of quotes and scores
+    the quotes of open projects. Returns one row per scored quote with the predictions
+    and how far the quoted hours and price deviate from them.
+    """
+    # Open projects have no actuals, so the actuals columns are left out entirely
+    # and the models see 0 for them, as in predict_new_project.
+    actuals = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in data_processor.SOURCE_COLUMNS['project_actuals'].items()})
+    columns = ['quote_id'] + [col for col in data_processor.SOURCE_COLUMNS['quotes'] if col != 'id'] + [
+        col for col in data_processor.SOURCE_COLUMNS['projects'] if col != 'id']
+    merged = data_processor.merge_data(_WORKER['projects'], quotes_df, actuals, columns=columns, completed_only=False)
+    if merged.empty:
+        return pd.DataFrame()
+    processed = data_processor.feature_engineering(merged, _WORKER['medians'], _WORKER['vendor_stats'])
+
+    hours, cost = predict.predict_batch(processed, _WORKER['hours_model'], _WORKER['cost_model'], _WORKER['pipeline'])
+    scores = processed[['quote_id', 'project_id', 'vendor_id', 'quoted_hours', 'quoted_price']].copy()
+    scores['predicted_hours'] = hours
+    scores['predicted_cost'] = cost
+    # Positive when the vendor quoted more than the models expect
+    scores['hours_deviation'] = scores['quoted_hours'] - hours
+    scores['cost_deviation'] = scores['quoted_price'] - cost
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores['hours_deviation_pct'] = 100 * scores['hours_deviation'] / hours
+        scores['cost_deviation_pct'] = 100 * scores['cost_deviation'] / cost
+    return scores
+
+def load_checkpoint(output_path):
+    """The progress of an earlier run writing to output_path, or None if there is none."""
+    try:
+        with open(output_path + CHECKPOINT_SUFFIX) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_checkpoint(checkpoint, output_path):
+    tmp_path = output_path + CHECKPOINT_SUFFIX + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, output_path + CHECKPOINT_SUFFIX)
+
+def _score_in_pool(executor, chunks, max_pending):
+    """Yields scored chunks in order, keeping at most max_pending chunks in flight."""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(score_chunk, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def score_backlog(data_path=".", output_path=OUTPUT_FILE, model_dir=".", chunk_rows=CHUNK_ROWS, workers=None, restart=False):
+    """
+    Re-scores every quote of an open (in_progress/planning) project in quotes.csv.
+
+    quotes.csv is read in chunks of chunk_rows rows, which are merged, feature
+    engineered and scored on a process pool with the models loaded once per worker.
+    The scores are appended to output_path (CSV) in quote order, and a checkpoint
+    next to it records how many chunks are done and how long the output was at that
+    point. Running again resumes after the last finished chunk; the checkpoint is
+    discarded (restart=True, or different models or chunk size) to start over.
+
+    Returns:
+        int: Number of quotes scored in total, or None if the models are missing.
+    """
+    try:
+        version = predict.model_version(model_dir)
+    except FileNotFoundError:
+        logger.error("Error: Model files not found. Please run train_model.py first.")
+        return None
+
+    checkpoint = None if restart else load_checkpoint(output_path)
+    if checkpoint is not None and (checkpoint['model_version'], checkpoint['chunk_rows']) != (version, chunk_rows):
+        logger.info("The checkpoint is for different models or chunk size, starting over.")
+        checkpoint = None
+    if checkpoint is None or not os.path.exists(output_path):
+        checkpoint = {'model_version': version, 'chunk_rows': chunk_rows, 'chunks_done': 0, 'rows_written': 0, 'output_bytes': 0}
+    else:
+        logger.info(f"Resuming after {checkpoint['chunks_done']} chunks ({checkpoint['rows_written']} quotes scored).")
+
+    cores = os.cpu_count()
+    workers = workers or cores
+    nthread = max(1, cores // workers)
+    logger.info(f"Scoring open quotes in chunks of {chunk_rows} rows with {workers} worker(s) x {nthread} thread(s)...")
+
+    # Rows of the chunks already scored are skipped without being parsed
+    chunks = data_processor.iter_quote_chunks(data_path, chunk_rows, skip_rows=checkpoint['chunks_done'] * chunk_rows)
+
+    start = time.perf_counter()
+    rows_at_start = checkpoint['rows_written']
+    executor = None
+    with open(output_path, 'r+b' if checkpoint['output_bytes'] else 'wb') as f:
+        # Drop anything an interrupted run wrote after its last checkpoint
+        f.truncate(checkpoint['output_bytes'])
+        f.seek(checkpoint['output_bytes'])
+        try:
+            if workers > 1:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                               initargs=(data_path, model_dir, nthread))
+                scored = _score_in_pool(executor, chunks, max_pending=2 * workers)
+            else:
+                _init_worker(data_path, model_dir, nthread)
+                scored = (score_chunk(chunk) for chunk in chunks)
+            for scores in scored:
+                if not scores.empty:
+                    f.write(scores.to_csv(index=False, header=f.tell() == 0).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                checkpoint['chunks_done'] += 1
+                checkpoint['rows_written'] += len(scores)
+                checkpoint['output_bytes'] = f.tell()
+                _save_checkpoint(checkpoint, output_path)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Chunk {checkpoint['chunks_done']}: {checkpoint['rows_written']} quotes scored "
+                            f"({(checkpoint['rows_written'] - rows_at_start) / elapsed:,.0f} quotes/sec).")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    logger.info(f"Scored {checkpoint['rows_written']} open quotes into {output_path}.")
+    return checkpoint['rows_written']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-scores the quotes of all open projects in quotes.csv.")
+    parser.add_argument('--data', default=".", help="Directory containing projects.csv and quotes.csv.")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="CSV file the scores are appended to.")
+    parser.add_argument('--model-dir', default=".", help="Directory containing hours_model.pkl and cost_model.pkl.")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Quotes read and scored per chunk.")
+    parser.add_argument('--workers', type=int, help="Scoring processes (default: one per core). Each gets cores // workers threads.")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an earlier run and start over.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    score_backlog(args.data, args.output, args.model_dir, args.chunk_rows, args.workers, args.restart)
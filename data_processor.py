@@ -1,76 +1,277 @@
 
 
+import argparse
+import glob
+import logging
+import os
+
 import pandas as pd
 import numpy as np
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMNS = ['quote_id', 'project_id', 'vendor_id', 'actual_id']
+TARGET_COLUMNS = ['target_hours', 'target_cost']
+CATEGORICAL_COLUMNS = ['status', 'team_experience_level', 'priority', 'risk_level']
+
+# Known technologies; each one becomes a multi-hot 'tech_<name>' feature
+TECH_STACK_OPTIONS = [
+    "Python", "JavaScript", "Java", "C#", "Go", "Ruby", "PHP",
+    "React", "Angular", "Vue.js", "Node.js", "Django", "Flask", "Spring",
+    "PostgreSQL", "MySQL", "MongoDB", "Redis", "SQLite",
+    "AWS", "Azure", "Google Cloud", "Docker", "Kubernetes"
+]
+
+# Fitted median of every numeric column, reused to impute missing values at inference time
+MEDIANS_FILE = "./imputation_medians.json"
+
+# Binary output of the pipeline: a directory with a Parquet copy of the processed data
+# and a memory-mappable float32 feature matrix described by schema.json
+MATRIX_DIR = "./processed_modeling_data"
+
+# Columns and dtypes parsed from each source file by load_data. Free text that
+# feature_engineering drops anyway (project name and description, vendor name,
+# contract date, payment terms) is never read, and the low-cardinality labels become categories.
+# Only the key columns are int64; counts that may be empty are float64 and
+# vendor_id is the nullable Int64, so missing values parse as NaN/<NA>.
+SOURCE_COLUMNS = {
+    'projects': {
+        'id': 'int64', 'project_type': 'category', 'status': 'category', 'start_date': 'object',
+        'end_date': 'object', 'function_points': 'float64', 'interface_count': 'float64',
+        'technology_stack': 'object', 'demand_stability_rating': 'float64', 'team_size': 'float64',
+        'team_experience_level': 'category', 'priority': 'category', 'risk_level': 'category',
+    },
+    'vendors': {'id': 'int64'},
+    'quotes': {
+        'id': 'int64', 'project_id': 'int64', 'vendor_id': 'Int64', 'quoted_hours': 'float64',
+        'quoted_price': 'float64', 'actual_contract_hours': 'float64', 'actual_contract_price': 'float64',
+    },
+    'project_actuals': {
+        'id': 'int64', 'project_id': 'int64', 'actual_effort_hours': 'float64', 'actual_final_cost': 'float64',
+        'delivery_quality_score': 'float64', 'user_satisfaction_score': 'float64',
+    },
+}
 
-def load_data(data_path="."):
-    """Loads all necessary CSV files from the specified path."""
-    print("Loading data from CSV files...")
+# Quotes per chunk when quotes.csv is streamed by iter_quote_chunks
+QUOTES_CHUNK_ROWS = 200_000
+
+def _read_source(path, columns=None):
+    """Reads one source CSV, optionally only the given {column: dtype}."""
+    options = {} if columns is None else {'usecols': list(columns), 'dtype': columns}
+    return pd.read_csv(path, **options)
+
+@instrumentation.instrumented('load')
+def load_data(data_path=".", all_columns=False):
+    """
+    Loads all necessary CSV files from the specified path.
+
+    The four files are parsed concurrently, and only the SOURCE_COLUMNS the pipeline
+    uses are read with explicit dtypes (all_columns=True reads every column with
+    inferred dtypes).
+    """
+    logger.info("Loading data from CSV files...")
     try:
-        projects_df = pd.read_csv(f"{data_path}/projects.csv")
-        vendors_df = pd.read_csv(f"{data_path}/vendors.csv")
-        quotes_df = pd.read_csv(f"{data_path}/quotes.csv")
-        actuals_df = pd.read_csv(f"{data_path}/project_actuals.csv")
-        print("All CSV files loaded successfully.")
+        with ThreadPoolExecutor(max_workers=len(SOURCE_COLUMNS)) as executor:
+            futures = [
+                executor.submit(_read_source, os.path.join(data_path, f"{name}.csv"), None if all_columns else columns)
+                for name, columns in SOURCE_COLUMNS.items()
+            ]
+            projects_df, vendors_df, quotes_df, actuals_df = [future.result() for future in futures]
+        logger.info("All CSV files loaded successfully.")
         return projects_df, vendors_df, quotes_df, actuals_df
     except FileNotFoundError as e:
-        print(f"Error loading files: {e}. Make sure all CSV files are in the correct directory.")
+        logger.error(f"Error loading files: {e}. Make sure all CSV files are in the correct directory.")
         return None, None, None, None
 
-def merge_data(projects_df, quotes_df, actuals_df):
-    """Merges the individual dataframes into a single modeling dataframe."""
-    print("Merging dataframes...")
-    
-    # We only care about completed projects with actuals for training
-    # and we need to select the "winning" quote for each project
-    
-    # 1. Filter for quotes that have a corresponding actuals record
-    completed_project_ids = actuals_df['project_id'].unique()
-    
-    # 2. From the quotes, only keep those for completed projects
-    training_quotes_df = quotes_df[quotes_df['project_id'].isin(completed_project_ids)].copy()
-    
-    # 3. Merge project information into the quotes
-    merged_df = pd.merge(training_quotes_df, projects_df, left_on='project_id', right_on='id', suffixes=('_quote', '_project'))
-    
-    # 4. Merge actuals information
-    # Since actuals are 1-to-1 with projects, we can merge directly
-    final_df = pd.merge(merged_df, actuals_df, on='project_id', suffixes=('', '_actual'))
+def iter_quote_chunks(data_path=".", chunksize=QUOTES_CHUNK_ROWS, skip_rows=0):
+    """
+    Streams quotes.csv as DataFrames of at most chunksize rows, parsed with the same
+    SOURCE_COLUMNS as load_data, for files too large to load at once.
+
+    Args:
+        data_path (str): Directory containing quotes.csv.
+        chunksize (int): Quotes per chunk.
+        skip_rows (int): Leading quotes to skip without parsing them (e.g. the chunks
+            an interrupted run already processed).
+    """
+    columns = SOURCE_COLUMNS['quotes']
+    # A callable, because pandas turns a list or range of rows to skip into a set
+    skiprows = (lambda row: 0 < row <= skip_rows) if skip_rows else None
+    yield from pd.read_csv(os.path.join(data_path, 'quotes.csv'), usecols=list(columns), dtype=columns,
+                           chunksize=chunksize, skiprows=skiprows)
+
+def _unique_index(keys, name):
+    """pd.Index of a join key, which get_indexer needs to be unique."""
+    index = pd.Index(keys)
+    if not index.is_unique:
+        duplicated = index[index.duplicated()].unique()
+        raise ValueError(f"Duplicate {name} values: {duplicated[:10].tolist()}"
+                         f"{' ...' if len(duplicated) > 10 else ''} ({len(duplicated)} in total)")
+    return index
+
+@instrumentation.instrumented('merge')
+def merge_data(projects_df, quotes_df, actuals_df, columns=None, completed_only=True):
+    """
+    Merges the individual dataframes into a single modeling dataframe.
+
+    Each quote is matched to its project and actuals row by looking its project_id up
+    in an index of projects_df['id'] and actuals_df['project_id'], and every output
+    column is gathered once by position. Both keys must be unique; otherwise a
+    ValueError names the duplicated ids. columns optionally restricts the output to
+    the given merged column names. With completed_only=False the quotes of projects
+    without actuals are kept too, with missing values in the actuals columns.
+    """
+    logger.info("Merging dataframes...")
     
-    # Clean up redundant ID columns
-    final_df = final_df.drop(columns=['id_project'])
-    final_df.rename(columns={'id_quote': 'quote_id', 'id': 'actual_id'}, inplace=True)
+    # We only care about completed projects with actuals for training,
+    # i.e. the quotes whose project has both a projects and an actuals row
+    project_index = _unique_index(projects_df['id'], 'projects id')
+    actual_index = _unique_index(actuals_df['project_id'], 'project_actuals project_id')
+    project_ids = quotes_df['project_id'].to_numpy()
+    project_pos = project_index.get_indexer(project_ids)
+    actual_pos = actual_index.get_indexer(project_ids)
+    keep = project_pos >= 0
+    if completed_only:
+        keep &= actual_pos >= 0
+    quote_pos = np.flatnonzero(keep)
+    project_pos, actual_pos = project_pos[quote_pos], actual_pos[quote_pos]
+
+    # Output name -> (source frame, source column, positions), with the column names
+    # that the previous pd.merge based implementation produced
+    shared = quotes_df.columns.intersection(projects_df.columns)
+    plan = {}
+    for col in quotes_df.columns:
+        plan[f"{col}_quote" if col in shared else col] = (quotes_df, col, quote_pos)
+    for col in projects_df.columns.drop('id'):
+        plan[f"{col}_project" if col in shared else col] = (projects_df, col, project_pos)
+    for col in actuals_df.columns.drop('project_id'):
+        plan[f"{col}_actual" if col in plan else col] = (actuals_df, col, actual_pos)
+
+    # Clean up the ID column names
+    renames = {'id_quote': 'quote_id', 'id': 'actual_id'}
+    plan = {renames.get(name, name): source for name, source in plan.items()}
+    if columns is not None:
+        plan = {name: plan[name] for name in columns}
+
+    # Position -1 (no actuals row) becomes a missing value
+    final_df = pd.DataFrame({name: frame[col].array.take(positions, allow_fill=True)
+                             for name, (frame, col, positions) in plan.items()}, copy=False)
     
-    print(f"Data merged. Shape of final dataframe: {final_df.shape}")
+    logger.info(f"Data merged. Shape of final dataframe: {final_df.shape}")
     return final_df
 
-def feature_engineering(df):
-    """Creates new features and cleans the merged dataframe."""
-    print("Performing feature engineering...")
+def encode_tech_stack(stacks, options=TECH_STACK_OPTIONS):
+    """
+    Parses the JSON 'technology_stack' strings and multi-hot encodes them against
+    options (TECH_STACK_OPTIONS by default). Quotes of the same project repeat the same string, so each
+    distinct string is parsed only once and the results are gathered back by position.
+
+    Returns:
+        tuple: (num_technologies array, DataFrame of uint8 'tech_*' columns)
+    """
+    codes, uniques = pd.factorize(stacks)
+
+    # Safely parse the distinct JSON strings
+    def parse_tech_stack(stack_str):
+        try:
+            parsed = json.loads(stack_str)
+        except (json.JSONDecodeError, TypeError):
+            return []
+        return parsed if isinstance(parsed, list) else []
+
+    # Row len(uniques) is an empty stack for missing values (factorize code -1)
+    parsed = pd.Series([parse_tech_stack(stack) for stack in uniques] + [[]])
+    counts = parsed.str.len().to_numpy()
+
+    exploded = parsed.explode()
+    vocab_index = pd.Index(options).get_indexer(exploded.to_numpy())
+    known = vocab_index >= 0
+    multi_hot = np.zeros((len(parsed), len(options)), dtype=np.uint8)
+    multi_hot[exploded.index.to_numpy()[known], vocab_index[known]] = 1
+
+    return counts[codes], pd.DataFrame(multi_hot[codes], columns=[f"tech_{tech}" for tech in options], index=stacks.index)
+
+def impute_medians(df, medians=None):
+    """
+    Fills missing numeric values in one pass. Uses the given medians (e.g. fitted at
+    training time) or computes them from df.
+
+    Returns:
+        pd.DataFrame: df with the missing values filled.
+    """
+    numeric_cols = df.select_dtypes(include=np.number).columns
+    missing = df[numeric_cols].isna().any()
+    missing_cols = missing.index[missing.to_numpy()]
+    if len(missing_cols) == 0:
+        return df
+
+    if medians is None:
+        fill_values = df[missing_cols].median()
+    else:
+        fill_values = pd.Series(medians).reindex(missing_cols)
+    df[missing_cols] = df[missing_cols].fillna(fill_values)
+    for col in missing_cols:
+        logger.info(f"Filled NaNs in '{col}' with median value: {fill_values[col]}")
+    return df
+
+def fit_medians(df):
+    """Median of every numeric column, for impute_medians at inference time."""
+    # Filling NaNs with the median does not move the median, so this also works on imputed data.
+    medians = df.select_dtypes(include=np.number).median()
+    return {col: float(value) for col, value in medians.items() if pd.notna(value)}
+
+def save_medians(medians, path=MEDIANS_FILE):
+    with open(path, 'w') as f:
+        json.dump(medians, f, ensure_ascii=False, indent=2)
+
+def load_medians(path=MEDIANS_FILE):
+    """Loads the medians saved by the training pipeline, or None if there are none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+@instrumentation.instrumented('engineer')
+def feature_engineering(df, medians=None, vendor_stats=None):
+    """
+    Creates new features and cleans the merged dataframe.
+
+    Args:
+        df (pd.DataFrame): The merged dataframe.
+        medians (dict): Optional fitted medians used to fill missing values. If not
+            given, the medians of df are used.
+        vendor_stats (vendor_stats.VendorStats): Optional precomputed vendor aggregates,
+            added as the vendor_* features of quotes being scored. Training data gets
+            them from vendor_stats.historical_features instead.
+    """
+    logger.info("Performing feature engineering...")
     
+    # --- Vendor Features ---
+    # Looked up before project_type is one-hot encoded and the actuals become targets
+    if vendor_stats is not None:
+        df = vendor_stats.add_features(df)
+
     # --- Date Features ---
     df['start_date'] = pd.to_datetime(df['start_date'])
     df['end_date'] = pd.to_datetime(df['end_date'])
-    df['contract_date'] = pd.to_datetime(df['contract_date'])
     
     # Calculate project duration in days
     df['project_duration_days'] = (df['end_date'] - df['start_date']).dt.days
     
     # --- JSON Feature ---
-    # Safely parse the JSON string in 'technology_stack'
-    def parse_tech_stack(stack_str):
-        try:
-            return json.loads(stack_str)
-        except (json.JSONDecodeError, TypeError):
-            return []
-            
-    df['tech_stack_list'] = df['technology_stack'].apply(parse_tech_stack)
-    df['num_technologies'] = df['tech_stack_list'].apply(len)
+    # Count and multi-hot encode the technologies in 'technology_stack'
+    num_technologies, tech_columns = encode_tech_stack(df['technology_stack'])
+    df['num_technologies'] = num_technologies
+    df = pd.concat([df, tech_columns], axis=1)
 
     # --- Categorical Feature Cleaning ---
     # One-hot encode project_type for simplicity in this first pass
-    df = pd.get_dummies(df, columns=['project_type'], prefix='type')
+    df = pd.get_dummies(df, columns=['project_type'], prefix='type', dtype=np.uint8)
     
     # --- Target Variable Definition ---
     # Our goal is to predict the actuals, so we define them as targets
@@ -80,41 +281,159 @@ def feature_engineering(df):
     }, inplace=True)
     
     # --- Clean up and select final columns ---
-    # Drop original complex columns that have been engineered
-    df = df.drop(columns=['technology_stack', 'tech_stack_list', 'start_date', 'end_date', 'contract_date', 'payment_terms', 'description', 'name'])
+    # Drop original complex columns that have been engineered (and unused text,
+    # which load_data normally does not read at all)
+    df = df.drop(columns=['technology_stack', 'start_date', 'end_date', 'contract_date', 'payment_terms', 'description', 'name'],
+                 errors='ignore')
     
     # Handle potential missing values (a simple strategy for now)
     # For numeric columns, fill with the median
-    for col in df.select_dtypes(include=np.number).columns:
-        if df[col].isnull().any():
-            median_val = df[col].median()
-            df[col].fillna(median_val, inplace=True)
-            print(f"Filled NaNs in '{col}' with median value: {median_val}")
+    df = impute_medians(df, medians)
 
-    print("Feature engineering complete.")
+    logger.info("Feature engineering complete.")
     return df
 
+def select_features(df):
+    """
+    Returns the numeric model features of a processed dataframe (identifiers and
+    targets excluded). The one-hot 'type_*' columns are bool in the binary format and
+    the feature store, so bool columns are kept too, as uint8.
+    """
+    features = df.drop(columns=TARGET_COLUMNS + ID_COLUMNS + ['status'], errors='ignore')
+    features = features.select_dtypes(include=[np.number, 'bool'])
+    bool_columns = features.columns[(features.dtypes == bool).to_numpy()]
+    return features.astype({col: np.uint8 for col in bool_columns})
+
+def optimize_dtypes(df):
+    """
+    Converts a processed dataframe to compact, explicit dtypes: category for the
+    label columns, bool for the one-hot columns, the smallest integer type for
+    identifiers and float32 for everything else that is numeric.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col.startswith('type_'):
+            df[col] = df[col].astype(bool)
+        elif col in ID_COLUMNS:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].astype(np.float32)
+    return df
+
+def save_processed(df, matrix_dir=MATRIX_DIR):
+    """
+    Saves the processed data in the binary interchange format:
+        data.parquet  - all columns with compact dtypes (see optimize_dtypes)
+        features.npy  - float32 model feature matrix, loadable with np.load(mmap_mode='r')
+        targets.npy   - float32 matrix of the target columns
+        schema.json   - column names, dtypes and category vocabularies
+    """
+    os.makedirs(matrix_dir, exist_ok=True)
+    df = optimize_dtypes(df)
+    df.to_parquet(os.path.join(matrix_dir, 'data.parquet'), index=False)
+
+    features = select_features(df)
+    np.save(os.path.join(matrix_dir, 'features.npy'), np.ascontiguousarray(features.to_numpy(dtype=np.float32)))
+    np.save(os.path.join(matrix_dir, 'targets.npy'), np.ascontiguousarray(df[TARGET_COLUMNS].to_numpy(dtype=np.float32)))
+
+    schema = {
+        'num_rows': len(df),
+        'feature_names': features.columns.tolist(),
+        'target_names': TARGET_COLUMNS,
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'categories': {col: df[col].cat.categories.tolist() for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)},
+    }
+    with open(os.path.join(matrix_dir, 'schema.json'), 'w') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    return matrix_dir
+
+def load_feature_matrix(matrix_dir=MATRIX_DIR, mmap_mode='r'):
+    """
+    Loads the feature and target matrices written by save_processed. With the default
+    mmap_mode='r' nothing is copied into memory until it is read.
+
+    Returns:
+        tuple: (features, targets, schema)
+    """
+    with open(os.path.join(matrix_dir, 'schema.json')) as f:
+        schema = json.load(f)
+    features = np.load(os.path.join(matrix_dir, 'features.npy'), mmap_mode=mmap_mode)
+    targets = np.load(os.path.join(matrix_dir, 'targets.npy'), mmap_mode=mmap_mode)
+    return features, targets, schema
+
+def iter_processed_batches(data_path, batch_size=100_000):
+    """
+    Yields the processed data as DataFrames of at most batch_size rows, without ever
+    loading all of it. data_path can be the binary feature matrix directory, a Parquet
+    file, a directory of Parquet partitions (the feature store) or a CSV file.
+    """
+    if os.path.exists(os.path.join(data_path, 'schema.json')):
+        features, targets, schema = load_feature_matrix(data_path)
+        for start in range(0, len(features), batch_size):
+            batch = np.hstack([features[start:start + batch_size], targets[start:start + batch_size]])
+            yield pd.DataFrame(batch, columns=schema['feature_names'] + schema['target_names'])
+    elif data_path.endswith('.parquet') or os.path.isdir(data_path):
+        import pyarrow.parquet as pq
+        paths = [data_path] if data_path.endswith('.parquet') else sorted(glob.glob(os.path.join(data_path, 'part-*.parquet')))
+        if not paths:
+            raise FileNotFoundError(f"No Parquet files found in {data_path}")
+        for path in paths:
+            for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(data_path, chunksize=batch_size)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Builds the modeling data from the raw CSV files.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only process new or changed projects and append them to the feature store.")
+    parser.add_argument('--store-dir', default="./feature_store", help="Feature store directory for --incremental.")
+    parser.add_argument('--rebuild', action='store_true', help="With --incremental, rebuild the feature store from scratch.")
+    parser.add_argument('--format', choices=['csv', 'binary', 'both'], default='both',
+                        help=f"Write processed_modeling_data.csv, the binary format in {MATRIX_DIR}, or both (default).")
+    parser.add_argument('--no-vendor-stats', action='store_true',
+                        help="Do not update the vendor aggregates or add the vendor_* features.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # Define the path to the data files
     DATA_PATH = "." 
     
-    # Run the pipeline
-    projects, vendors, quotes, actuals = load_data(DATA_PATH)
+    if args.incremental:
+        from feature_store import update_store
+        update_store(DATA_PATH, args.store_dir, rebuild=args.rebuild, vendor_stats=not args.no_vendor_stats)
+    else:
+        # Run the pipeline
+        projects, vendors, quotes, actuals = load_data(DATA_PATH)
     
-    if projects is not None:
-        # Merge the data
-        merged_data = merge_data(projects, quotes, actuals)
-        
-        # Engineer features
-        processed_data = feature_engineering(merged_data)
+        if projects is not None:
+            # Merge the data
+            merged_data = merge_data(projects, quotes, actuals)
+
+            if not args.no_vendor_stats:
+                from vendor_stats import historical_features, update_saved_stats
+                # Training rows get the vendor features as of their own quote date...
+                merged_data = historical_features(merged_data, projects, quotes, actuals)
+                # ...and the aggregates as of now are kept up to date for serving
+                update_saved_stats(projects, quotes, actuals)
         
-        # Save the processed data
-        output_path = f"{DATA_PATH}/processed_modeling_data.csv"
-        processed_data.to_csv(output_path, index=False)
+            # Engineer features
+            processed_data = feature_engineering(merged_data)
         
-        print(f"\nData processing pipeline complete!")
-        print(f"Processed data saved to: {output_path}")
-        print("Final data columns:", processed_data.columns.tolist())
-        print("Sample of processed data:")
-        print(processed_data.head())
+            # Save the fitted medians for inference
+            save_medians(fit_medians(processed_data))
 
+            # Save the processed data
+            logger.info(f"\nData processing pipeline complete!")
+            if args.format in ('csv', 'both'):
+                output_path = f"{DATA_PATH}/processed_modeling_data.csv"
+                processed_data.to_csv(output_path, index=False)
+                logger.info(f"Processed data saved to: {output_path}")
+            if args.format in ('binary', 'both'):
+                matrix_dir = save_processed(processed_data, MATRIX_DIR)
+                logger.info(f"Binary feature matrix saved to: {matrix_dir}")
+            logger.info(f"Final data columns: {processed_data.columns.tolist()}")
+            logger.info("Sample of processed data:")
+            logger.info(processed_data.head())
@@ -0,0 +1,162 @@
+import argparse
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import xgboost as xgb
+
+from prediction_cache import row_keys
+
+logger = logging.getLogger(__name__)
+
+IMPORTANCE_TYPES = ('gain', 'total_gain', 'cover', 'total_cover', 'weight')
+TARGETS = ('hours', 'cost')
+
+class ModelExplainer:
+    """
+    Explains the predictions of the models held by a ModelRegistry: per-quote
+    feature contributions (TreeSHAP, Booster.predict(pred_contribs=True)) for a
+    whole batch at once, and global feature importance by gain or cover.
+
+    Contributions are cached per row in a bounded LRU keyed like the prediction
+    cache (feature vector + model version), and importances per model version, so
+    both are dropped as soon as the registry loads retrained models.
+    """
+
+    def __init__(self, registry, max_size=100_000):
+        self.registry = registry
+        self.max_size = max_size
+        self.version = None
+        self._contribution_cache = OrderedDict()  # row key -> (n_features + 1, 2) array
+        self._importance = {}  # importance type -> {'hours': {...}, 'cost': {...}}
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self._contribution_cache.clear()
+                self._importance.clear()
+                self.version = version
+
+    def _contributions_for(self, data, state):
+        """contributions() for the models of one registry snapshot."""
+        self._check_version(state.version)
+        X = self.registry.featurize(data, state)
+
+        keys = row_keys(X, state.version)
+        values = np.full((len(X), len(state.feature_names) + 1, 2), np.nan, dtype=np.float32)
+        with self._lock:
+            if self.version == state.version:
+                for i, key in enumerate(keys):
+                    cached = self._contribution_cache.get(key)
+                    if cached is not None:
+                        self._contribution_cache.move_to_end(key)
+                        values[i] = cached
+
+        missing = np.flatnonzero(np.isnan(values[:, -1, 0]))
+        if len(missing):
+            # One TreeSHAP pass per model over all uncached rows
+            dmatrix = xgb.DMatrix(X[missing], feature_names=state.feature_names)
+            values[missing, :, 0] = state.hours_booster.predict(dmatrix, pred_contribs=True)
+            values[missing, :, 1] = state.cost_booster.predict(dmatrix, pred_contribs=True)
+            with self._lock:
+                # Not cached if the registry moved on to other models in the meantime
+                if self.version == state.version:
+                    for i in missing:
+                        self._contribution_cache[keys[i]] = values[i]
+                    while len(self._contribution_cache) > self.max_size:
+                        self._contribution_cache.popitem(last=False)
+        return {'hours': values[:, :, 0], 'cost': values[:, :, 1]}
+
+    def contributions(self, data):
+        """
+        Per-feature contributions of a batch of quotes (records, a DataFrame or a file
+        path, as in predict.predict_batch). The registry's models are read once, so the
+        whole batch is explained by one model version.
+
+        Returns:
+            dict: {'hours': array, 'cost': array}, each of shape (n_rows, n_features + 1).
+                The last column is the bias; each row sums to the prediction.
+        """
+        return self._contributions_for(data, self.registry.current_state())
+
+    def importance(self, importance_type='total_gain', with_version=False):
+        """
+        Global feature importance of both models, normalized to sum to 1. Features that
+        are never split on get 0.
+
+        Returns:
+            dict: {'hours': {feature: importance}, 'cost': {feature: importance}}, or
+                (that dict, model version) with with_version=True.
+        """
+        if importance_type not in IMPORTANCE_TYPES:
+            raise ValueError(f"Unknown importance type '{importance_type}', expected one of {', '.join(IMPORTANCE_TYPES)}")
+        state = self.registry.current_state()
+        self._check_version(state.version)
+        with self._lock:
+            result = self._importance.get(importance_type) if self.version == state.version else None
+        if result is None:
+            result = {}
+            for target, booster in zip(TARGETS, (state.hours_booster, state.cost_booster)):
+                scores = booster.get_score(importance_type=importance_type)
+                total = sum(scores.values()) or 1.0
+                result[target] = {name: scores.get(name, 0.0) / total for name in state.feature_names}
+            with self._lock:
+                if self.version == state.version:
+                    self._importance[importance_type] = result
+        return (result, state.version) if with_version else result
+
+    def explain(self, data, top_k=5, with_version=False):
+        """
+        JSON-ready explanations: for every quote and target, the prediction, the bias
+        and the top_k features by absolute contribution (all of them if top_k is None).
+        With with_version=True, returns (explanations, model version).
+        """
+        state = self.registry.current_state()
+        contributions = self._contributions_for(data, state)
+        names = np.array(state.feature_names, dtype=object)
+        explanations = [{} for _ in range(len(contributions['hours']))]
+        for target, values in contributions.items():
+            features = values[:, :-1]
+            order = np.argsort(-np.abs(features), axis=1)[:, :top_k]
+            predictions = values.sum(axis=1)
+            for i, explanation in enumerate(explanations):
+                top = order[i]
+                explanation[target] = {
+                    'prediction': float(predictions[i]),
+                    'bias': float(values[i, -1]),
+                    'contributions': dict(zip(names[top].tolist(), features[i, top].astype(float).tolist())),
+                }
+        return (explanations, state.version) if with_version else explanations
+
+if __name__ == '__main__':
+    # model_server imports this module for its /explain endpoint
+    from model_server import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Explains the hours and cost predictions of a batch of quotes.")
+    parser.add_argument('data', nargs='?', help="CSV/Parquet file or feature store directory with the quotes to explain.")
+    parser.add_argument('--model-dir', default=".", help="Directory containing hours_model.pkl and cost_model.pkl.")
+    parser.add_argument('--top-k', type=int, default=5, help="Features listed per quote and target.")
+    parser.add_argument('--importance', choices=IMPORTANCE_TYPES, default='total_gain', help="Global importance type.")
+    parser.add_argument('--output', help="Write the JSON here instead of stdout.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    model_registry = ModelRegistry(args.model_dir)
+    if model_registry.version is None:
+        raise SystemExit(1)
+    explainer = ModelExplainer(model_registry)
+    importance, version = explainer.importance(args.importance, with_version=True)
+    report = {'model_version': version, 'importance': importance}
+    if args.data:
+        report['quotes'], report['model_version'] = explainer.explain(args.data, args.top_k, with_version=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        logger.info(f"Explanations written to {args.output}")
+    else:
+        print(text)
@@ -0,0 +1,81 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import xgboost as xgb
+
+import predict
+from preprocessing import PIPELINE_FILE
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = ('hours_model', 'cost_model')
+
+def export_models(model_dir=".", out_dir=".", file_format='ubj'):
+    """
+    Converts hours_model.pkl/cost_model.pkl into XGBoost's own model format
+    (UBJSON by default, or JSON). The exported files only need xgboost to load:
+    no pickle, no scikit-learn wrapper. Feature names are stored in the model and
+    the preprocessing pipeline is copied alongside.
+
+    Returns:
+        list: The paths of the exported models, or None if the .pkl files are missing.
+    """
+    hours_model, cost_model = predict.load_models(model_dir)
+    if hours_model is None:
+        return None
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, model in zip(MODEL_NAMES, (hours_model, cost_model)):
+        path = os.path.join(out_dir, f"{name}.{file_format}")
+        model.get_booster().save_model(path)
+        paths.append(path)
+        logger.info(f"Exported {name}.pkl to {path}")
+
+    pipeline = predict.load_pipeline(model_dir)
+    if pipeline is not None:
+        pipeline.save(os.path.join(out_dir, PIPELINE_FILE))
+    return paths
+
+class FastPredictor:
+    """
+    Scores the exported boosters directly with Booster.inplace_predict on float32
+    NumPy arrays, skipping the scikit-learn wrapper, pandas validation and DMatrix
+    construction of the pickle path.
+    """
+
+    def __init__(self, model_dir=".", file_format='ubj', nthread=None):
+        self.hours_booster = xgb.Booster(model_file=os.path.join(model_dir, f"hours_model.{file_format}"))
+        self.cost_booster = xgb.Booster(model_file=os.path.join(model_dir, f"cost_model.{file_format}"))
+        if nthread is not None:
+            self.hours_booster.set_param({'nthread': nthread})
+            self.cost_booster.set_param({'nthread': nthread})
+        self.feature_names = self.hours_booster.feature_names
+        self.pipeline = predict.load_pipeline(model_dir)
+        self.vendor_stats = predict.load_vendor_stats()
+
+    def predict(self, X):
+        """
+        Predicts from a feature matrix whose columns are in self.feature_names order.
+
+        Returns:
+            tuple: (predicted_hours, predicted_cost) as float32 numpy arrays.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.hours_booster.inplace_predict(X), self.cost_booster.inplace_predict(X)
+
+    def predict_records(self, data):
+        """Same as predict.predict_batch: accepts records, a DataFrame or a file path."""
+        return self.predict(predict.prepare_features(predict.read_records(data), self.feature_names, self.pipeline, self.vendor_stats))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exports the trained models to XGBoost's native format for fast inference.")
+    parser.add_argument('--model-dir', default=".", help="Directory containing hours_model.pkl and cost_model.pkl.")
+    parser.add_argument('--out-dir', default=".", help="Where to write the exported models.")
+    parser.add_argument('--format', choices=['ubj', 'json'], default='ubj', help="UBJSON (compact, default) or JSON.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    export_models(args.model_dir, args.out_dir, args.format)
@@ -0,0 +1,183 @@
+import glob
+import json
+import logging
+import os
+
+import pandas as pd
+
+from data_processor import load_data, merge_data, feature_engineering
+from vendor_stats import STATS_DIR, historical_features, update_saved_stats
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "./feature_store"
+STATE_FILE = "state.json"
+FINGERPRINT_FILE = "project_fingerprints.parquet"
+SOURCE_FILES = ['projects.csv', 'vendors.csv', 'quotes.csv', 'project_actuals.csv']
+
+def _source_signature(data_path):
+    """(mtime, size) of every source CSV. Used to skip the update entirely when nothing changed."""
+    signature = {}
+    for name in SOURCE_FILES:
+        stat = os.stat(os.path.join(data_path, name))
+        signature[name] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+def _empty_state():
+    # Changes are found through the per-project fingerprints, not by id ranges
+    return {'sources': None, 'next_part': 0, 'num_rows': 0}
+
+def load_state(store_dir=STORE_DIR):
+    """Loads the store's bookkeeping state, or an empty state for a new store."""
+    try:
+        with open(os.path.join(store_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_state()
+
+def _save_state(state, store_dir):
+    tmp_path = os.path.join(store_dir, STATE_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, STATE_FILE))
+
+def _project_fingerprints(projects_df, quotes_df, actuals_df):
+    """
+    One uint64 per project that changes whenever the project row, its actuals row(s)
+    or any of its quotes is added or edited.
+    """
+    project_ids = projects_df['id'].to_numpy()
+    project_hash = pd.util.hash_pandas_object(projects_df, index=False).to_numpy()
+    quote_hash = (pd.util.hash_pandas_object(quotes_df, index=False)
+                  .groupby(quotes_df['project_id'].to_numpy()).sum()
+                  .reindex(project_ids, fill_value=0).to_numpy())
+    actual_hash = (pd.util.hash_pandas_object(actuals_df, index=False)
+                   .groupby(actuals_df['project_id'].to_numpy()).sum()
+                   .reindex(project_ids, fill_value=0).to_numpy())
+
+    # uint64 addition wraps around, which is fine for a fingerprint
+    fingerprint = project_hash + quote_hash + actual_hash
+    return pd.Series(fingerprint, index=pd.Index(project_ids, name='project_id'), name='fingerprint')
+
+def _drop_projects(store_dir, project_ids):
+    """Removes the rows of the given projects from the partitions that contain them."""
+    removed = 0
+    for path in sorted(glob.glob(os.path.join(store_dir, 'part-*.parquet'))):
+        part_project_ids = pd.read_parquet(path, columns=['project_id'])['project_id']
+        stale = part_project_ids.isin(project_ids)
+        if not stale.any():
+            continue
+        part = pd.read_parquet(path)
+        part = part[~stale.to_numpy()]
+        removed += int(stale.sum())
+        if part.empty:
+            os.remove(path)
+        else:
+            part.to_parquet(path, index=False)
+    return removed
+
+def update_store(data_path=".", store_dir=STORE_DIR, rebuild=False, vendor_stats=True, stats_dir=STATS_DIR):
+    """
+    Brings the feature store up to date with the source CSVs.
+
+    Only projects that are new, or whose project/quote/actuals rows changed since the
+    last run, go through merge_data and feature_engineering; their rows are appended to
+    the store as a new Parquet partition. If none of the source files changed on disk,
+    this returns without reading them.
+
+    As in the full pipeline, the rows get the vendor_* features as of their quote date
+    (vendor_stats.historical_features, computed over all source rows) and the serving
+    vendor aggregates in stats_dir are brought up to date, unless vendor_stats=False.
+
+    Note that median imputation in feature_engineering only sees the rows of the
+    current partition, and that rows already in the store keep the vendor features
+    they were written with; rebuild=True recomputes everything.
+
+    Returns:
+        int: The number of rows written, or None if the source data could not be loaded.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    if rebuild:
+        for path in glob.glob(os.path.join(store_dir, 'part-*.parquet')) + glob.glob(os.path.join(store_dir, FINGERPRINT_FILE)):
+            os.remove(path)
+        state = _empty_state()
+    else:
+        state = load_state(store_dir)
+
+    signature = _source_signature(data_path)
+    if signature == state['sources']:
+        logger.info("Feature store is up to date, nothing to do.")
+        return 0
+
+    projects, vendors, quotes, actuals = load_data(data_path)
+    if projects is None:
+        return None
+    # merge_data needs one actuals row per project; a re-recorded project keeps its latest row
+    duplicated = actuals['project_id'].duplicated(keep='last')
+    if duplicated.any():
+        logger.warning(f"{int(duplicated.sum())} older duplicate project_actuals rows ignored.")
+        actuals = actuals[~duplicated.to_numpy()]
+
+    # 1. Find the projects whose inputs are new, changed or deleted
+    fingerprints = _project_fingerprints(projects, quotes, actuals)
+    fingerprint_path = os.path.join(store_dir, FINGERPRINT_FILE)
+    if os.path.exists(fingerprint_path):
+        previous = pd.read_parquet(fingerprint_path)['fingerprint']
+        common = fingerprints.index.intersection(previous.index)
+        changed = common[fingerprints.loc[common].to_numpy() != previous.loc[common].to_numpy()]
+        dirty = fingerprints.index.difference(previous.index).union(changed)
+        deleted = previous.index.difference(fingerprints.index)
+    else:
+        dirty = fingerprints.index
+        deleted = pd.Index([])
+    logger.info(f"{len(dirty)} new or changed projects and {len(deleted)} deleted projects since the last update.")
+
+    # 2. Remove stale rows of changed/deleted projects and process only the dirty ones
+    stale = dirty.union(deleted)
+    removed = _drop_projects(store_dir, stale) if len(stale) else 0
+    num_written = 0
+    new_quotes = quotes[quotes['project_id'].isin(dirty)]
+    if not new_quotes.empty:
+        merged = merge_data(projects, new_quotes, actuals)
+        if not merged.empty:
+            if vendor_stats:
+                merged = historical_features(merged, projects, quotes, actuals)
+            processed = feature_engineering(merged)
+            part_path = os.path.join(store_dir, f"part-{state['next_part']:05d}.parquet")
+            processed.to_parquet(part_path, index=False)
+            state['next_part'] += 1
+            num_written = len(processed)
+            logger.info(f"Wrote {num_written} rows to {part_path}")
+
+    if vendor_stats:
+        _, num_quotes, num_actuals = update_saved_stats(projects, quotes, actuals, stats_dir, rebuild)
+        logger.info(f"Vendor stats updated with {num_quotes} new quotes and {num_actuals} new actuals.")
+
+    # 3. Record what has been processed
+    fingerprints.to_frame().to_parquet(fingerprint_path)
+    state['sources'] = signature
+    state['num_rows'] = state['num_rows'] + num_written - removed
+    _save_state(state, store_dir)
+    logger.info(f"Feature store updated: {state['num_rows']} rows in total.")
+    return num_written
+
+def read_store(store_dir=STORE_DIR, columns=None):
+    """
+    Reads all partitions of the feature store into one DataFrame.
+
+    Partitions can have different one-hot 'type_*' columns (a partition only has the
+    project types it contains), so missing ones are filled with False.
+    """
+    paths = sorted(glob.glob(os.path.join(store_dir, 'part-*.parquet')))
+    if not paths:
+        raise FileNotFoundError(f"No feature store partitions found in {store_dir}")
+    parts = [pd.read_parquet(path) for path in paths]
+    df = pd.concat(parts, ignore_index=True)
+
+    type_columns = sorted(col for col in df.columns if col.startswith('type_'))
+    df[type_columns] = df[type_columns].astype('boolean').fillna(False).astype(bool)
+    other_columns = [col for col in df.columns if not col.startswith('type_')]
+    df = df[other_columns + type_columns]
+    if columns is not None:
+        df = df[columns]
+    return df
@@ -1,19 +1,26 @@
-
+import argparse
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 
 import pandas as pd
 import numpy as np
 from faker import Faker
-import random
-import json
-from datetime import datetime, timedelta
+
+from data_processor import TECH_STACK_OPTIONS
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 NUM_VENDORS = 20
 NUM_PROJECTS = 500
 MAX_QUOTES_PER_PROJECT = 3
-
-# Initialize Faker for data generation
-fake = Faker('zh_CN') # Use Chinese data where possible
+CHUNK_SIZE = 50_000 # Projects generated (and written) per chunk
+TEXT_POOL_SIZE = 2000 # Faker words/paragraphs sampled for project names and descriptions
+# Project dates fall 1-3 years before this date; it is fixed so a seed always gives the same data
+REFERENCE_DATE = date(2025, 1, 1)
 
 # --- Lists for Categorical Data ---
 PROJECT_TYPES = ['软件开发', '系统集成', '硬件采购', '咨询服务', '市场推广']
@@ -21,148 +28,305 @@ PROJECT_STATUSES = ['completed', 'in_progress', 'planning', 'cancelled']
 TEAM_EXPERIENCE_LEVELS = ['junior', 'mixed', 'senior']
 PRIORITIES = ['low', 'medium', 'high']
 RISK_LEVELS = ['low', 'medium', 'high']
-TECH_STACK_OPTIONS = [
-    "Python", "JavaScript", "Java", "C#", "Go", "Ruby", "PHP",
-    "React", "Angular", "Vue.js", "Node.js", "Django", "Flask", "Spring",
-    "PostgreSQL", "MySQL", "MongoDB", "Redis", "SQLite",
-    "AWS", "Azure", "Google Cloud", "Docker", "Kubernetes"
-]
+PAYMENT_TERMS = ['Net 30', 'Net 60', '50/50 Split']
+
+# Column types of each generated table, so every Parquet chunk is written with the
+# same schema (e.g. contract_date stays a string column when a chunk has no contracts)
+COLUMN_TYPES = {
+    'vendors': {'id': 'int64', 'name': 'string'},
+    'projects': {
+        'id': 'int64', 'name': 'string', 'project_type': 'string', 'description': 'string', 'status': 'string',
+        'start_date': 'string', 'end_date': 'string', 'function_points': 'int64', 'interface_count': 'int64',
+        'technology_stack': 'string', 'demand_stability_rating': 'float64', 'team_size': 'int64',
+        'team_experience_level': 'string', 'priority': 'string', 'risk_level': 'string',
+    },
+    'quotes': {
+        'id': 'int64', 'project_id': 'int64', 'vendor_id': 'int64', 'quoted_hours': 'float64', 'quoted_price': 'float64',
+        'actual_contract_hours': 'float64', 'actual_contract_price': 'float64', 'contract_date': 'string',
+        'payment_terms': 'string',
+    },
+    'project_actuals': {
+        'id': 'int64', 'project_id': 'int64', 'actual_effort_hours': 'float64', 'actual_final_cost': 'float64',
+        'delivery_quality_score': 'float64', 'user_satisfaction_score': 'float64',
+    },
+}
+
+# Per-process cache of the Faker text pool, see _text_pool
+_TEXT_POOLS = {}
+
+def _text_pool(seed):
+    """
+    Faker is far too slow to call once per row at millions of rows, so a pool of
+    words and paragraphs is generated once per process and sampled with NumPy.
+    """
+    if seed not in _TEXT_POOLS:
+        fake = Faker('zh_CN') # Use Chinese data where possible
+        fake.seed_instance(seed)
+        words = np.array([fake.word().capitalize() for _ in range(TEXT_POOL_SIZE)], dtype=object)
+        paragraphs = np.array([fake.paragraph(nb_sentences=3) for _ in range(TEXT_POOL_SIZE)], dtype=object)
+        _TEXT_POOLS[seed] = (words, paragraphs)
+    return _TEXT_POOLS[seed]
+
+def _sample_without_replacement(rng, num_rows, population, k):
+    """
+    Draws k distinct values from range(population) for every row, vectorized
+    across rows. Returns an int array of shape (num_rows, k).
+    """
+    chosen = np.empty((num_rows, k), dtype=np.int64)
+    for j in range(k):
+        # Draw from the values not chosen yet, then shift past the chosen ones in ascending order
+        draw = rng.integers(0, population - j, num_rows)
+        for taken in np.sort(chosen[:, :j], axis=1).T:
+            draw += draw >= taken
+        chosen[:, j] = draw
+    return chosen
+
+def _random_dates(rng, start, end):
+    """A uniformly random date between start and end (inclusive) for every row."""
+    span = (end - start).astype('timedelta64[D]').astype(np.int64)
+    return start + (rng.random(len(span)) * (span + 1)).astype('timedelta64[D]')
 
 # --- 1. Generate Vendors ---
-def generate_vendors(num_vendors):
-    print("Generating vendors...")
-    vendors = []
-    for i in range(1, num_vendors + 1):
-        vendors.append({
-            'id': i,
-            'name': fake.company()
-        })
-    vendors_df = pd.DataFrame(vendors)
-    vendors_df.to_csv('vendors.csv', index=False)
-    print(f"Generated {len(vendors_df)} vendors.")
+def generate_vendors(num_vendors, seed=42):
+    logger.info("Generating vendors...")
+    fake = Faker('zh_CN')
+    fake.seed_instance(seed)
+    vendors_df = pd.DataFrame({
+        'id': np.arange(1, num_vendors + 1),
+        'name': [fake.company() for _ in range(num_vendors)],
+    })
+    logger.info(f"Generated {len(vendors_df)} vendors.")
     return vendors_df
 
 # --- 2. Generate Projects ---
-def generate_projects(num_projects):
-    print("Generating projects...")
-    projects = []
-    for i in range(1, num_projects + 1):
-        start_date = fake.date_between(start_date='-3y', end_date='-1y')
-        end_date = start_date + timedelta(days=random.randint(30, 365))
-        
-        # Make data slightly more realistic
-        project_type = random.choice(PROJECT_TYPES)
-        tech_stack = random.sample(TECH_STACK_OPTIONS, k=random.randint(2, 6)) if project_type in ['软件开发', '系统集成'] else []
-        
-        projects.append({
-            'id': i,
-            'name': f"{fake.word().capitalize()}{fake.word().capitalize()}项目",
-            'project_type': project_type,
-            'description': fake.paragraph(nb_sentences=3),
-            'status': random.choice(PROJECT_STATUSES),
-            'start_date': start_date,
-            'end_date': end_date,
-            'function_points': random.randint(10, 500) if project_type in ['软件开发', '系统集成'] else 0,
-            'interface_count': random.randint(1, 50) if project_type == '系统集成' else 0,
-            'technology_stack': json.dumps(tech_stack),
-            'demand_stability_rating': round(random.uniform(1, 5), 1),
-            'team_size': random.randint(2, 20),
-            'team_experience_level': random.choice(TEAM_EXPERIENCE_LEVELS),
-            'priority': random.choice(PRIORITIES),
-            'risk_level': random.choice(RISK_LEVELS)
-        })
-    projects_df = pd.DataFrame(projects)
-    projects_df.to_csv('projects.csv', index=False)
-    print(f"Generated {len(projects_df)} projects.")
-    return projects_df
+def generate_projects(num_projects, rng, seed=42, start_id=1):
+    n = num_projects
+    words, paragraphs = _text_pool(seed)
+    reference = np.datetime64(REFERENCE_DATE, 'D')
+    start_date = _random_dates(rng, np.full(n, reference - 3 * 365), np.full(n, reference - 365))
+    end_date = start_date + rng.integers(30, 366, n).astype('timedelta64[D]')
+
+    # Make data slightly more realistic
+    project_type = rng.choice(PROJECT_TYPES, n)
+    is_software = np.isin(project_type, ['软件开发', '系统集成'])
+    is_integration = project_type == '系统集成'
+
+    # Software/integration projects use 2-6 distinct technologies, serialized as JSON lists
+    num_techs = np.where(is_software, rng.integers(2, 7, n), 0)
+    tech_index = _sample_without_replacement(rng, n, len(TECH_STACK_OPTIONS), 6)
+    quoted_techs = np.array([f'"{tech}"' for tech in TECH_STACK_OPTIONS], dtype=object)
+    tech_stack = np.full(n, '[', dtype=object)
+    for j in range(6):
+        separator = ', ' if j else ''
+        tech_stack = tech_stack + np.where(j < num_techs, separator + quoted_techs[tech_index[:, j]], '')
+    tech_stack = tech_stack + ']'
+
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + n),
+        'name': words[rng.integers(0, len(words), n)] + words[rng.integers(0, len(words), n)] + '项目',
+        'project_type': project_type,
+        'description': paragraphs[rng.integers(0, len(paragraphs), n)],
+        'status': rng.choice(PROJECT_STATUSES, n),
+        'start_date': start_date.astype(str),
+        'end_date': end_date.astype(str),
+        'function_points': np.where(is_software, rng.integers(10, 501, n), 0),
+        'interface_count': np.where(is_integration, rng.integers(1, 51, n), 0),
+        'technology_stack': tech_stack,
+        'demand_stability_rating': rng.uniform(1, 5, n).round(1),
+        'team_size': rng.integers(2, 21, n),
+        'team_experience_level': rng.choice(TEAM_EXPERIENCE_LEVELS, n),
+        'priority': rng.choice(PRIORITIES, n),
+        'risk_level': rng.choice(RISK_LEVELS, n),
+    })
 
 # --- 3. Generate Quotes ---
-def generate_quotes(projects_df, vendors_df):
-    print("Generating quotes...")
-    quotes = []
-    quote_id_counter = 1
-    for _, project in projects_df.iterrows():
-        num_quotes = random.randint(1, MAX_QUOTES_PER_PROJECT)
-        assigned_vendors = random.sample(list(vendors_df['id']), k=num_quotes)
-        
-        for vendor_id in assigned_vendors:
-            # --- Core Logic for Realistic Pricing ---
-            # Base price on complexity factors
-            base_hours = (project['function_points'] * 1.5 + 
-                          project['interface_count'] * 10 + 
-                          project['team_size'] * 20)
-            
-            # Adjust for risk and experience
-            if project['risk_level'] == 'high': base_hours *= 1.2
-            if project['team_experience_level'] == 'junior': base_hours *= 1.15
-            
-            # Add some randomness for vendor differences
-            vendor_factor = random.uniform(0.9, 1.3)
-            quoted_hours = base_hours * vendor_factor
-            
-            # Assume an average hourly rate with some variance
-            hourly_rate = random.uniform(100, 200) # in some currency unit
-            quoted_price = (quoted_hours * hourly_rate) / 10000 # in 10k units
-            
-            # Simulate negotiation for contract price
-            negotiation_factor = random.uniform(0.85, 1.05)
-            actual_contract_price = quoted_price * negotiation_factor if project['status'] in ['completed', 'in_progress'] else None
-            actual_contract_hours = quoted_hours * negotiation_factor if project['status'] in ['completed', 'in_progress'] else None
-
-            quotes.append({
-                'id': quote_id_counter,
-                'project_id': project['id'],
-                'vendor_id': vendor_id,
-                'quoted_hours': round(quoted_hours, 2),
-                'quoted_price': round(quoted_price, 2),
-                'actual_contract_hours': round(actual_contract_hours, 2) if actual_contract_hours else None,
-                'actual_contract_price': round(actual_contract_price, 2) if actual_contract_price else None,
-                'contract_date': fake.date_between(start_date=project['start_date'], end_date=project['end_date']) if actual_contract_price else None,
-                'payment_terms': random.choice(['Net 30', 'Net 60', '50/50 Split'])
-            })
-            quote_id_counter += 1
-            
-    quotes_df = pd.DataFrame(quotes)
-    quotes_df.to_csv('quotes.csv', index=False)
-    print(f"Generated {len(quotes_df)} quotes.")
-    return quotes_df
+def generate_quotes(projects_df, vendor_ids, rng, max_quotes=MAX_QUOTES_PER_PROJECT, start_id=1):
+    vendor_ids = np.asarray(vendor_ids)
+    num_quotes = rng.integers(1, max_quotes + 1, len(projects_df))
+
+    # Each project gets quotes from num_quotes distinct vendors
+    vendor_index = _sample_without_replacement(rng, len(projects_df), len(vendor_ids), max_quotes)
+    quote_mask = np.arange(max_quotes) < num_quotes[:, None]
+    project_pos = np.repeat(np.arange(len(projects_df)), num_quotes)
+    project = projects_df.iloc[project_pos]
+    n = len(project_pos)
+
+    # --- Core Logic for Realistic Pricing ---
+    # Base price on complexity factors
+    base_hours = (project['function_points'].to_numpy() * 1.5 +
+                  project['interface_count'].to_numpy() * 10 +
+                  project['team_size'].to_numpy() * 20)
+
+    # Adjust for risk and experience
+    base_hours = base_hours * np.where(project['risk_level'].to_numpy() == 'high', 1.2, 1.0)
+    base_hours = base_hours * np.where(project['team_experience_level'].to_numpy() == 'junior', 1.15, 1.0)
+
+    # Add some randomness for vendor differences
+    quoted_hours = base_hours * rng.uniform(0.9, 1.3, n)
+
+    # Assume an average hourly rate with some variance
+    hourly_rate = rng.uniform(100, 200, n) # in some currency unit
+    quoted_price = (quoted_hours * hourly_rate) / 10000 # in 10k units
+
+    # Simulate negotiation for contract price
+    negotiation_factor = rng.uniform(0.85, 1.05, n)
+    has_contract = np.isin(project['status'].to_numpy(), ['completed', 'in_progress'])
+    actual_contract_price = np.where(has_contract, quoted_price * negotiation_factor, np.nan)
+    actual_contract_hours = np.where(has_contract, quoted_hours * negotiation_factor, np.nan)
+
+    contract_date = _random_dates(
+        rng, project['start_date'].to_numpy().astype('datetime64[D]'), project['end_date'].to_numpy().astype('datetime64[D]')
+    ).astype(str).astype(object)
+    contract_date[~has_contract] = None
+
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + n),
+        'project_id': project['id'].to_numpy(),
+        'vendor_id': vendor_ids[vendor_index[quote_mask]],
+        'quoted_hours': quoted_hours.round(2),
+        'quoted_price': quoted_price.round(2),
+        'actual_contract_hours': actual_contract_hours.round(2),
+        'actual_contract_price': actual_contract_price.round(2),
+        'contract_date': contract_date,
+        'payment_terms': rng.choice(PAYMENT_TERMS, n),
+    })
 
 # --- 4. Generate Project Actuals ---
-def generate_project_actuals(quotes_df):
-    print("Generating project actuals...")
+def generate_project_actuals(quotes_df, rng, start_id=1):
     # Only generate actuals for projects that have a contract
     completed_quotes = quotes_df.dropna(subset=['actual_contract_price'])
-    
+
     # We need to select one quote per project to be the "winner"
     completed_quotes = completed_quotes.loc[completed_quotes.groupby('project_id')['actual_contract_price'].idxmin()]
+    n = len(completed_quotes)
+
+    # Simulate execution variance
+    execution_factor = rng.uniform(0.95, 1.25, n) # Could be over or under budget/time
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + n),
+        'project_id': completed_quotes['project_id'].to_numpy(),
+        'actual_effort_hours': (completed_quotes['actual_contract_hours'].to_numpy() * execution_factor).round(2),
+        'actual_final_cost': (completed_quotes['actual_contract_price'].to_numpy() * execution_factor).round(2),
+        'delivery_quality_score': rng.uniform(2.5, 5.0, n).round(1),
+        'user_satisfaction_score': rng.uniform(2.0, 5.0, n).round(1),
+    })
+
+def generate_chunk(chunk_index, start_id, num_projects, vendor_ids, seed=42, max_quotes=MAX_QUOTES_PER_PROJECT):
+    """
+    Generates the projects, quotes and actuals for one chunk of projects. The RNG is
+    seeded from (seed, chunk_index), so the output does not depend on how chunks are
+    spread across processes. Quote and actual ids start at 1 and are renumbered by the caller.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    projects_df = generate_projects(num_projects, rng, seed, start_id)
+    quotes_df = generate_quotes(projects_df, vendor_ids, rng, max_quotes)
+    actuals_df = generate_project_actuals(quotes_df, rng)
+    return projects_df, quotes_df, actuals_df
+
+class ChunkWriter:
+    """
+    Appends DataFrame chunks to one CSV or Parquet file, so memory stays bounded by the chunk size.
+    column_types ({column: type name}, see COLUMN_TYPES) fixes the Parquet schema; without it
+    the schema is taken from the first chunk.
+    """
+
+    def __init__(self, path, file_format='csv', column_types=None):
+        self.path = path
+        self.file_format = file_format
+        self.column_types = column_types
+        self.num_rows = 0
+        self._writer = None
+
+    def write(self, df):
+        if self.file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                if self.column_types is not None:
+                    schema = pa.schema([(col, pa.type_for_alias(name)) for col, name in self.column_types.items()])
+                else:
+                    schema = pa.Table.from_pandas(df, preserve_index=False).schema
+                self._writer = pq.ParquetWriter(self.path, schema)
+            table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='w' if self.num_rows == 0 else 'a', header=self.num_rows == 0, index=False)
+        self.num_rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def _generate_in_pool(executor, chunk_args, max_pending):
+    """Yields generated chunks in order, keeping at most max_pending chunks in flight."""
+    pending = deque()
+    for args in chunk_args:
+        pending.append(executor.submit(generate_chunk, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def generate_dataset(num_projects=NUM_PROJECTS, num_vendors=NUM_VENDORS, seed=42, max_quotes=MAX_QUOTES_PER_PROJECT,
+                     out_dir=".", file_format='csv', chunk_size=CHUNK_SIZE, workers=1):
+    """
+    Generates vendors, projects, quotes and project actuals and streams them to
+    vendors/projects/quotes/project_actuals.{csv,parquet} in out_dir, chunk by chunk.
+    With workers > 1 the chunks are generated in a process pool and written in order.
+    """
+    if num_vendors < max_quotes:
+        raise ValueError(f"Need at least {max_quotes} vendors to give a project {max_quotes} distinct quotes.")
+    os.makedirs(out_dir, exist_ok=True)
+
+    vendors_df = generate_vendors(num_vendors, seed)
+    vendors_writer = ChunkWriter(os.path.join(out_dir, f'vendors.{file_format}'), file_format, COLUMN_TYPES['vendors'])
+    vendors_writer.write(vendors_df)
+    vendors_writer.close()
+    vendor_ids = vendors_df['id'].to_numpy()
+
+    writers = {name: ChunkWriter(os.path.join(out_dir, f'{name}.{file_format}'), file_format, COLUMN_TYPES[name])
+               for name in ['projects', 'quotes', 'project_actuals']}
+    chunk_starts = list(range(1, num_projects + 1, chunk_size))
+    chunk_args = [(i, start, min(chunk_size, num_projects - start + 1), vendor_ids, seed, max_quotes)
+                  for i, start in enumerate(chunk_starts)]
+
+    logger.info(f"Generating {num_projects} projects in {len(chunk_args)} chunks with {workers} worker(s)...")
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            chunks = _generate_in_pool(executor, chunk_args, max_pending=2 * workers)
+        else:
+            chunks = (generate_chunk(*args) for args in chunk_args)
+        for projects_df, quotes_df, actuals_df in chunks:
+            # Renumber quotes and actuals so ids are sequential across chunks
+            quotes_df['id'] += writers['quotes'].num_rows
+            actuals_df['id'] += writers['project_actuals'].num_rows
+            writers['projects'].write(projects_df)
+            writers['quotes'].write(quotes_df)
+            writers['project_actuals'].write(actuals_df)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for writer in writers.values():
+            writer.close()
 
-    actuals = []
-    for _, quote in completed_quotes.iterrows():
-        # Simulate execution variance
-        execution_factor = random.uniform(0.95, 1.25) # Could be over or under budget/time
-        actual_effort_hours = quote['actual_contract_hours'] * execution_factor
-        actual_final_cost = quote['actual_contract_price'] * execution_factor
-        
-        actuals.append({
-            'id': len(actuals) + 1,
-            'project_id': quote['project_id'],
-            'actual_effort_hours': round(actual_effort_hours, 2),
-            'actual_final_cost': round(actual_final_cost, 2),
-            'delivery_quality_score': round(random.uniform(2.5, 5.0), 1),
-            'user_satisfaction_score': round(random.uniform(2.0, 5.0), 1)
-        })
-        
-    actuals_df = pd.DataFrame(actuals)
-    actuals_df.to_csv('project_actuals.csv', index=False)
-    print(f"Generated {len(actuals_df)} project actuals.")
-    return actuals_df
+    logger.info(f"Generated {len(vendors_df)} vendors, {writers['projects'].num_rows} projects, "
+                f"{writers['quotes'].num_rows} quotes and {writers['project_actuals'].num_rows} project actuals.")
 
 # --- Main Execution ---
 if __name__ == '__main__':
-    vendors_data = generate_vendors(NUM_VENDORS)
-    projects_data = generate_projects(NUM_PROJECTS)
-    quotes_data = generate_quotes(projects_data, vendors_data)
-    project_actuals_data = generate_project_actuals(quotes_data)
-    print("\nMock data generation complete!")
-    print("Generated files: vendors.csv, projects.csv, quotes.csv, project_actuals.csv")
+    parser = argparse.ArgumentParser(description="Generates mock vendors, projects, quotes and project actuals.")
+    parser.add_argument('--projects', type=int, default=NUM_PROJECTS, help=f"Number of projects (default: {NUM_PROJECTS}).")
+    parser.add_argument('--vendors', type=int, default=NUM_VENDORS, help=f"Number of vendors (default: {NUM_VENDORS}).")
+    parser.add_argument('--max-quotes', type=int, default=MAX_QUOTES_PER_PROJECT, help="Maximum quotes per project.")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed; the output is the same for any number of workers.")
+    parser.add_argument('--out-dir', default=".", help="Output directory.")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Output file format.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Projects generated and written per chunk.")
+    parser.add_argument('--workers', type=int, default=1, help="Processes used to generate chunks.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+    generate_dataset(args.projects, args.vendors, args.seed, args.max_quotes, args.out_dir, args.format, args.chunk_size, args.workers)
+    logger.info("\nMock data generation complete!")
+    logger.info(f"Generated files in {args.out_dir}: vendors, projects, quotes and project_actuals (.{args.format})")
@@ -0,0 +1,250 @@
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Opt-in through the environment: PIPELINE_METRICS is the output file (a '.prom'
+# suffix selects the Prometheus text format, anything else JSON lines) and
+# PIPELINE_PROFILE is 'cprofile' or 'pyinstrument'.
+METRICS_ENV = "PIPELINE_METRICS"
+PROFILE_ENV = "PIPELINE_PROFILE"
+
+class _State:
+    def __init__(self):
+        self.path = None
+        self.format = None
+        self.profiler = None
+        self.profile_dir = "."
+        self.local = threading.local()  # per-thread stack of open stages
+        self.latest = {}  # stage -> last record, for the Prometheus output
+        self.lock = threading.Lock()
+
+    @property
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+_STATE = _State()
+
+def enable(path, fmt=None, profiler=None, profile_dir="."):
+    """
+    Starts recording stage metrics to path.
+
+    Args:
+        path (str): Output file. JSON lines are appended; the Prometheus text file
+            is rewritten after every stage.
+        fmt (str): 'jsonl' or 'prometheus'. Guessed from the file suffix if not given.
+        profiler (str): Optionally 'cprofile' or 'pyinstrument', to profile every
+            outermost stage into profile_dir.
+    """
+    _STATE.path = path
+    _STATE.format = fmt or ('prometheus' if path.endswith('.prom') else 'jsonl')
+    _STATE.profiler = profiler
+    _STATE.profile_dir = profile_dir
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    _STATE.path = None
+    _STATE.profiler = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def enabled():
+    return _STATE.path is not None
+
+class StageRecord:
+    """Metrics of one stage. Set rows_out (and rows_in if not known up front) inside the block."""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.peak_bytes = 0
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if key != 'peak_bytes'}
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    """
+    Records wall time, CPU time, peak traced memory and rows in/out of the block.
+    Does nothing but yield a record when instrumentation is disabled.
+
+        with instrumentation.stage('merge', rows_in=len(quotes_df)) as record:
+            ...
+            record.rows_out = len(final_df)
+    """
+    record = StageRecord(name, rows_in)
+    if not enabled():
+        yield record
+        return
+
+    # tracemalloc has a single peak counter: hand the peak so far to the enclosing
+    # stage before resetting it for this one.
+    if _STATE.stack:
+        parent = _STATE.stack[-1]
+        parent.peak_bytes = max(parent.peak_bytes, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    _STATE.stack.append(record)
+
+    profile = _start_profile() if len(_STATE.stack) == 1 and _STATE.profiler else None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        if profile is not None:
+            _stop_profile(profile, name)
+        record.peak_bytes = max(record.peak_bytes, tracemalloc.get_traced_memory()[1])
+        _STATE.stack.pop()
+        if _STATE.stack:
+            _STATE.stack[-1].peak_bytes = max(_STATE.stack[-1].peak_bytes, record.peak_bytes)
+        emit({
+            'event': 'stage',
+            **record.to_dict(),
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'peak_traced_mb': record.peak_bytes / 2**20,
+            # ru_maxrss (KB on Linux) also covers XGBoost's native allocations
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+
+def _count_rows(value):
+    """Total rows of the DataFrames/arrays in value (a single one, or a tuple or list of them)."""
+    if isinstance(value, (tuple, list)):
+        counts = [_count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return len(value) if hasattr(value, 'shape') else None
+
+def instrumented(name):
+    """
+    Decorator that runs the function as a stage. rows_in counts the rows of the
+    DataFrame/array arguments and rows_out those of the return value.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with stage(name, rows_in=_count_rows([*args, *kwargs.values()])) as record:
+                result = func(*args, **kwargs)
+                record.rows_out = _count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+def emit(record):
+    """Writes one record in the configured format."""
+    if not enabled():
+        return
+    record = {'timestamp': time.time(), **record}
+    with _STATE.lock:
+        if _STATE.format == 'prometheus':
+            _STATE.latest[(record['event'], record.get('name'))] = record
+            _write_prometheus(_STATE.path, _STATE.latest.values())
+        else:
+            with open(_STATE.path, 'a') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def _write_prometheus(path, records):
+    lines = []
+    for record in records:
+        labels = f'stage="{record["name"]}"'
+        for key, value in record.items():
+            if key in ('event', 'name', 'timestamp') or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"pipeline_{record['event']}_{key}{{{labels}}} {value}")
+    # Written to a temporary file and renamed, so a scraper never reads half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def _start_profile():
+    if _STATE.profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed; falling back to cProfile.")
+        else:
+            profile = Profiler()
+            profile.start()
+            return profile
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def _stop_profile(profile, name):
+    if isinstance(profile, cProfile.Profile):
+        profile.disable()
+        path = os.path.join(_STATE.profile_dir, f"{name}.prof")
+        profile.dump_stats(path)
+    else:
+        profile.stop()
+        path = os.path.join(_STATE.profile_dir, f"{name}.html")
+        with open(path, 'w') as f:
+            f.write(profile.output_html())
+    logger.info(f"Profile of stage '{name}' saved to {path}")
+
+@functools.lru_cache(maxsize=None)
+def _iteration_timer_class():
+    # Defined on first use: importing xgboost takes about a second, which every script
+    # importing data_processor (and so this module) would otherwise pay
+    import xgboost as xgb
+
+    class IterationTimer(xgb.callback.TrainingCallback):
+        """Records the wall time of every boosting round and emits them when training ends."""
+
+        def __init__(self, name):
+            super().__init__()
+            self.name = name
+            self.iteration_seconds = []
+            self._start = None
+
+        def before_iteration(self, model, epoch, evals_log):
+            self._start = time.perf_counter()
+            return False
+
+        def after_iteration(self, model, epoch, evals_log):
+            self.iteration_seconds.append(time.perf_counter() - self._start)
+            return False
+
+        def after_training(self, model):
+            seconds = self.iteration_seconds
+            if seconds:
+                emit({
+                    'event': 'xgboost_training',
+                    'name': self.name,
+                    'iterations': len(seconds),
+                    'total_seconds': sum(seconds),
+                    'mean_iteration_seconds': sum(seconds) / len(seconds),
+                    'max_iteration_seconds': max(seconds),
+                    'iteration_seconds': seconds,
+                })
+            return model
+
+    return IterationTimer
+
+def __getattr__(name):
+    if name == 'IterationTimer':
+        return _iteration_timer_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def xgb_callbacks(name):
+    """The training callbacks to pass to XGBoost: an IterationTimer when enabled, otherwise None."""
+    return [_iteration_timer_class()(name)] if enabled() else None
+
+if os.environ.get(METRICS_ENV):
+    enable(os.environ[METRICS_ENV], profiler=os.environ.get(PROFILE_ENV))
@@ -0,0 +1,406 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import xgboost as xgb
+
+import predict
+from explain_model import ModelExplainer
+from prediction_cache import CACHE_FILE, create_cache
+from vendor_stats import STATS_DIR, stats_signature
+
+logger = logging.getLogger(__name__)
+
+# Everything a prediction needs from one model version. Reloads build a new
+# ModelState and swap it in whole, so a request never mixes two versions.
+ModelState = namedtuple('ModelState', ['version', 'hours_booster', 'cost_booster', 'feature_names', 'pipeline', 'vendor_stats'])
+
+class ModelRegistry:
+    """
+    Keeps the hours and cost models and their preprocessing pipeline loaded in
+    memory and hot-reloads them when the files change on disk. The vendor aggregates
+    in stats_dir are reloaded whenever they change too. With a prediction
+    cache, repeated quotes are answered without running the models; the cache
+    keys include the model version, so a reload invalidates them.
+
+    The loaded models are held in one immutable ModelState. Callers take it once
+    with snapshot() and use it for the whole request.
+    """
+
+    def __init__(self, model_dir=".", check_interval=1.0, cache=None, stats_dir=STATS_DIR):
+        self.model_dir = model_dir
+        self.stats_dir = stats_dir
+        self.check_interval = check_interval
+        self.cache = cache
+        self._state = None
+        self._signature = None
+        self._loaded_stats_signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()  # guards _state
+        self._reload_lock = threading.Lock()  # one reload at a time, without blocking readers
+        self.reload_if_changed(force=True)
+
+    def snapshot(self):
+        """The current ModelState, or None if no models have been loaded."""
+        with self._lock:
+            return self._state
+
+    @property
+    def version(self):
+        state = self.snapshot()
+        return state.version if state is not None else None
+
+    @property
+    def hours_booster(self):
+        return self.snapshot().hours_booster
+
+    @property
+    def cost_booster(self):
+        return self.snapshot().cost_booster
+
+    @property
+    def feature_names(self):
+        return self.snapshot().feature_names
+
+    @property
+    def pipeline(self):
+        return self.snapshot().pipeline
+
+    @property
+    def vendor_stats(self):
+        return self.snapshot().vendor_stats
+
+    def _file_signature(self):
+        # mtime + size is cheap to check on every call; the content hash is only
+        # computed when this signature changes.
+        signature = []
+        for name in predict.model_files(self.model_dir):
+            stat = os.stat(os.path.join(self.model_dir, name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def reload_if_changed(self, force=False):
+        """
+        Reloads both models if their files changed, or only the vendor stats if just
+        those changed. Returns True if a reload happened.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        with self._reload_lock:
+            self._last_check = now
+            # The vendor aggregates are updated on their own (vendor_stats.py), between retrains
+            stats_files = stats_signature(self.stats_dir)
+            try:
+                signature = self._file_signature()
+            except FileNotFoundError:
+                logger.error("Error: Model files not found. Please run train_model.py first.")
+                return False
+            models_changed = force or signature != self._signature
+            if models_changed:
+                version = predict.model_version(self.model_dir)
+                if not force and version == self.version:
+                    # Touched but not changed
+                    self._signature = signature
+                    models_changed = False
+
+            if not models_changed:
+                state = self.snapshot()
+                if state is None or stats_files == self._loaded_stats_signature:
+                    return False
+                # Same models, new aggregates. The prediction cache needs no invalidation:
+                # its keys are the feature vectors, which include the vendor features.
+                with self._lock:
+                    self._state = state._replace(vendor_stats=predict.load_vendor_stats(self.stats_dir))
+                self._loaded_stats_signature = stats_files
+                logger.info(f"Reloaded vendor stats from '{self.stats_dir}'.")
+                return True
+
+            hours_model, cost_model = predict.load_models(self.model_dir)
+            if hours_model is None:
+                return False
+            hours_booster = hours_model.get_booster()
+            state = ModelState(
+                version=version,
+                hours_booster=hours_booster,
+                cost_booster=cost_model.get_booster(),
+                feature_names=hours_booster.feature_names,
+                pipeline=predict.load_pipeline(self.model_dir),
+                vendor_stats=predict.load_vendor_stats(self.stats_dir),
+            )
+            with self._lock:
+                self._state = state
+            self._signature = signature
+            self._loaded_stats_signature = stats_files
+            logger.info(f"Loaded models version {version} from '{self.model_dir}'.")
+            return True
+
+    def current_state(self):
+        """Reloads the models if they changed and returns the ModelState to use for one request."""
+        self.reload_if_changed()
+        state = self.snapshot()
+        if state is None:
+            raise RuntimeError(f"No models loaded from '{self.model_dir}'")
+        return state
+
+    def featurize(self, data, state):
+        """The feature matrix of a batch of records (or a DataFrame or file path) for the models in state."""
+        return predict.prepare_features(predict.read_records(data), state.feature_names, state.pipeline, state.vendor_stats)
+
+    def score(self, X, state):
+        """Predicts hours and cost for a feature matrix with the models in state, through the cache if there is one."""
+        if self.cache is not None:
+            return self.cache.predict(X, state.version, lambda rows: self._score(rows, state))
+        return self._score(X, state)
+
+    def predict(self, data):
+        """Predicts hours and cost for a batch using the resident models."""
+        state = self.current_state()
+        return self.score(self.featurize(data, state), state)
+
+    @staticmethod
+    def _score(X, state):
+        dmatrix = xgb.DMatrix(X, feature_names=state.feature_names)
+        return state.hours_booster.predict(dmatrix), state.cost_booster.predict(dmatrix)
+
+class MicroBatcher:
+    """
+    Collects prediction requests from concurrent clients and scores them together,
+    so Booster.predict is called on blocks of rows instead of single rows.
+    """
+
+    def __init__(self, registry, max_batch_size=1024, max_wait_ms=2.0):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, records):
+        """Blocks until the records have been scored. Returns (hours, cost, model_version)."""
+        request = {'records': records, 'done': threading.Event(), 'result': None, 'error': None}
+        self._queue.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['result']
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        num_rows = len(batch[0]['records'])
+        deadline = time.monotonic() + self.max_wait
+        while num_rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            num_rows += len(request['records'])
+        return batch
+
+    def _score_batch(self, batch):
+        """
+        Scores the requests of one micro-batch with a single model snapshot. Each
+        request is validated and featurized on its own, so a bad record only fails
+        its own request; if scoring the combined rows fails, every request is
+        re-scored separately.
+        """
+        try:
+            state = self.registry.current_state()
+        except Exception as e:
+            for request in batch:
+                request['error'] = e
+            return
+
+        valid = []
+        for request in batch:
+            try:
+                request['X'] = self.registry.featurize(request['records'], state)
+                valid.append(request)
+            except Exception as e:
+                request['error'] = e
+        if not valid:
+            return
+
+        try:
+            hours, cost = self.registry.score(np.vstack([request['X'] for request in valid]), state)
+            offset = 0
+            for request in valid:
+                end = offset + len(request['X'])
+                request['result'] = (hours[offset:end], cost[offset:end], state.version)
+                offset = end
+        except Exception:
+            logger.exception("Scoring a micro-batch failed, scoring its requests one by one.")
+            for request in valid:
+                try:
+                    hours, cost = self.registry.score(request['X'], state)
+                    request['result'] = (hours, cost, state.version)
+                except Exception as e:
+                    # The records were valid, so this is a server error (XGBoostError is a ValueError)
+                    logger.exception("Scoring a request failed.")
+                    request['error'] = RuntimeError(f"Scoring failed: {e}")
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._score_batch(batch)
+            finally:
+                for request in batch:
+                    request.pop('X', None)
+                    if request['result'] is None and request['error'] is None:
+                        request['error'] = RuntimeError("The request was not scored")
+                    request['done'].set()
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoints:
+        GET  /health   -> {"status": "ok", "model_version": ..., "cache": {hit/miss counters} or null}
+        POST /predict  -> body is a record or a list of records,
+                          returns {"hours": [...], "cost": [...], "model_version": ...}
+        POST /explain  -> same body, returns {"explanations": [per-quote top feature contributions], "model_version": ...}
+        GET  /importance?type=total_gain -> {"importance": {"hours": {...}, "cost": {...}}, "model_version": ...}
+    """
+    batcher = None
+    explainer = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_internal_error(self):
+        logger.exception(f"Error handling {self.command} {self.path}")
+        self._send_json(500, {'error': "Internal server error"})
+
+    def do_GET(self):
+        try:
+            self._handle_get()
+        except Exception:
+            self._send_internal_error()
+
+    def _handle_get(self):
+        path, _, query = self.path.partition('?')
+        if path == '/health':
+            registry = self.batcher.registry
+            cache_stats = registry.cache.stats() if registry.cache is not None else None
+            self._send_json(200, {'status': 'ok', 'model_version': registry.version, 'cache': cache_stats})
+        elif path == '/importance':
+            params = urllib.parse.parse_qs(query)
+            try:
+                importance, version = self.explainer.importance(params.get('type', ['total_gain'])[0], with_version=True)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, {'importance': importance, 'model_version': version})
+        else:
+            self._send_json(404, {'error': f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        if self.path not in ('/predict', '/explain'):
+            self._send_json(404, {'error': f"Unknown path '{self.path}'"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            records = json.loads(self.rfile.read(length))
+            if isinstance(records, dict):
+                records = [records]
+            if not isinstance(records, list):
+                raise ValueError("Expected a record or a list of records")
+            if self.path == '/explain':
+                # Explanations are batched per request; TreeSHAP is vectorized over its rows
+                explanations, version = self.explainer.explain(records, with_version=True)
+                self._send_json(200, {'explanations': explanations, 'model_version': version})
+                return
+            hours, cost, version = self.batcher.submit(records)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception:
+            self._send_internal_error()
+            return
+        self._send_json(200, {
+            'hours': np.asarray(hours, dtype=float).tolist(),
+            'cost': np.asarray(cost, dtype=float).tolist(),
+            'model_version': version,
+        })
+
+    def log_message(self, format, *args):
+        # Per-request logging to stderr costs more than the prediction itself.
+        pass
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 resets connections under concurrent load.
+    request_queue_size = 128
+
+class UnixHTTPServer(PredictionHTTPServer):
+    """PredictionHTTPServer listening on a Unix domain socket instead of a TCP port."""
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+def create_server(registry, host='127.0.0.1', port=8000, unix_socket=None, max_batch_size=1024, max_wait_ms=2.0):
+    """Creates (but does not start) the prediction server."""
+    batcher = MicroBatcher(registry, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    handler = type('BoundPredictionHandler', (PredictionHandler,), {'batcher': batcher, 'explainer': ModelExplainer(registry)})
+    if unix_socket:
+        return UnixHTTPServer(unix_socket, handler)
+    return PredictionHTTPServer((host, port), handler)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serves hours/cost predictions over HTTP.")
+    parser.add_argument('--model-dir', default=".", help="Directory containing hours_model.pkl and cost_model.pkl.")
+    parser.add_argument('--stats-dir', default=STATS_DIR, help="Vendor aggregates kept up to date by vendor_stats.py.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', help="Listen on this Unix socket path instead of a TCP port.")
+    parser.add_argument('--max-batch-size', type=int, default=1024, help="Maximum rows scored in one micro-batch.")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="How long to wait for more requests before scoring a batch.")
+    parser.add_argument('--cache', choices=['none', 'memory', 'sqlite'], default='none',
+                        help="Prediction cache: in-process, or a SQLite file shared by several server processes.")
+    parser.add_argument('--cache-path', default=CACHE_FILE, help="SQLite file for --cache sqlite.")
+    parser.add_argument('--cache-size', type=int, help="Maximum cached predictions (LRU eviction).")
+    parser.add_argument('--cache-ttl', type=float, help="Seconds a cached prediction stays valid.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    model_registry = ModelRegistry(args.model_dir, cache=create_cache(args.cache, args.cache_path, args.cache_size, args.cache_ttl),
+                                   stats_dir=args.stats_dir)
+    if model_registry.version is None:
+        raise SystemExit(1)
+
+    server = create_server(model_registry, args.host, args.port, args.unix_socket, args.max_batch_size, args.max_wait_ms)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    logger.info(f"Prediction server listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down prediction server.")
+    finally:
+        server.server_close()
@@ -1,80 +1,276 @@
 
 
+import hashlib
+import logging
+import os
+
 import pandas as pd
 import joblib
 import numpy as np
+import xgboost as xgb
+
+import instrumentation
+from preprocessing import PIPELINE_FILE, FeaturePipeline
+from vendor_stats import STATS_DIR, VENDOR_FEATURES, VendorStats, stats_signature
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ('hours_model.pkl', 'cost_model.pkl')
+
+def load_models(model_dir="."):
+    """Loads the hours and cost models from disk. Returns (None, None) if they are missing."""
+    try:
+        hours_model = joblib.load(os.path.join(model_dir, 'hours_model.pkl'))
+        cost_model = joblib.load(os.path.join(model_dir, 'cost_model.pkl'))
+        return hours_model, cost_model
+    except FileNotFoundError:
+        logger.error("Error: Model files not found. Please run train_model.py first.")
+        return None, None
+
+def model_files(model_dir="."):
+    """The files that make up the served models: both .pkl files and the preprocessing pipeline if present."""
+    # Models trained before the preprocessing pipeline existed have no pipeline file
+    if os.path.exists(os.path.join(model_dir, PIPELINE_FILE)):
+        return MODEL_FILES + (PIPELINE_FILE,)
+    return MODEL_FILES
+
+def model_version(model_dir="."):
+    """A short content hash of the model files. It changes whenever the models are retrained."""
+    digest = hashlib.sha256()
+    for name in model_files(model_dir):
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def load_pipeline(model_dir="."):
+    """Loads the preprocessing pipeline saved by train_model.py. Returns None for models trained without one."""
+    try:
+        return FeaturePipeline.load(os.path.join(model_dir, PIPELINE_FILE))
+    except FileNotFoundError:
+        return None
+
+def load_vendor_stats(stats_dir=STATS_DIR):
+    """Loads the precomputed vendor aggregates. Returns None if vendor_stats.py has not been run."""
+    try:
+        return VendorStats.load(stats_dir)
+    except FileNotFoundError:
+        return None
+
+# Models kept in memory by load_resident_models: model_dir -> (file signature, models, pipeline, version)
+_RESIDENT = {}
+
+def load_resident_models(model_dir="."):
+    """
+    Loads the models, their preprocessing pipeline and version once and reuses them
+    while the model files are unchanged (same mtime and size), so repeated single
+    predictions do not unpickle the models every time.
+
+    Returns:
+        tuple: (hours_model, cost_model, pipeline, version). Raises FileNotFoundError
+            if the models are missing.
+    """
+    signature = tuple((stat.st_mtime_ns, stat.st_size) for stat in
+                      (os.stat(os.path.join(model_dir, name)) for name in model_files(model_dir)))
+    resident = _RESIDENT.get(model_dir)
+    if resident is None or resident[0] != signature:
+        hours_model = joblib.load(os.path.join(model_dir, 'hours_model.pkl'))
+        cost_model = joblib.load(os.path.join(model_dir, 'cost_model.pkl'))
+        resident = (signature, hours_model, cost_model, load_pipeline(model_dir), model_version(model_dir))
+        _RESIDENT[model_dir] = resident
+    return resident[1:]
+
+# Vendor stats kept in memory by load_resident_vendor_stats: stats_dir -> (file signature, stats)
+_RESIDENT_STATS = {}
+
+def load_resident_vendor_stats(stats_dir=STATS_DIR):
+    """Like load_vendor_stats, but the stats are only read again when their files change."""
+    signature = stats_signature(stats_dir)
+    if signature is None:
+        return None
+    resident = _RESIDENT_STATS.get(stats_dir)
+    if resident is None or resident[0] != signature:
+        resident = (signature, load_vendor_stats(stats_dir))
+        _RESIDENT_STATS[stats_dir] = resident
+    return resident[1]
+
+def read_records(data):
+    """
+    Converts the supported batch inputs into a DataFrame.
+
+    Args:
+        data: A list of dicts, a DataFrame, a path to a CSV/Parquet file, or a
+            feature store directory.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if isinstance(data, (str, os.PathLike)):
+        path = os.fspath(data)
+        if os.path.isdir(path):
+            from feature_store import read_store
+            return read_store(path)
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+    return pd.DataFrame.from_records(data)
+
+def prepare_features(input_df, feature_names, pipeline=None, vendor_stats=None):
+    """
+    Turns raw records into the model's float32 feature matrix of shape
+    (n_rows, len(feature_names)).
 
-def predict_new_project(project_data):
+    Uses the fitted preprocessing pipeline when one matching the model is given.
+    Otherwise 'project_type' is one-hot encoded and the columns are aligned to the
+    model's feature order in a single vectorized pass. With vendor_stats, records
+    with a 'vendor_id' get the vendor_* features looked up first. Vendor features
+    that are still absent (no vendor_id, no stats) are missing values, so they get
+    the fitted medians like an unknown vendor rather than 0.
+    """
+    if (vendor_stats is not None and 'vendor_id' in input_df.columns
+            and not input_df.columns.isin(VENDOR_FEATURES).any()):
+        input_df = vendor_stats.add_features(input_df)
+    absent = [name for name in VENDOR_FEATURES if name in feature_names and name not in input_df.columns]
+    if absent:
+        input_df = input_df.assign(**{name: np.nan for name in absent})
+
+    if pipeline is not None and pipeline.feature_names == list(feature_names):
+        return pipeline.transform(input_df)
+
+    if 'project_type' in input_df.columns:
+        dummies = pd.get_dummies(input_df['project_type'], prefix='type')
+        input_df = pd.concat([input_df.drop(columns=['project_type']), dummies], axis=1)
+
+    # Missing columns are filled with 0 and unknown ones are dropped, all at once.
+    aligned = input_df.reindex(columns=feature_names, fill_value=0)
+    return aligned.to_numpy(dtype=np.float32)
+
+def predict_batch(data, hours_model=None, cost_model=None, pipeline=None, cache=None, version=None, vendor_stats=None):
+    """
+    Predicts hours and cost for a whole batch of quotes at once.
+
+    Args:
+        data: A list of dicts, a DataFrame, a path to a CSV/Parquet file, or a feature store
+            directory. Each record has the same fields as the dict accepted by predict_new_project.
+        hours_model, cost_model: Already loaded models. Loaded from disk if not given.
+        pipeline: The preprocessing pipeline of the models. Loaded from disk with the models.
+        vendor_stats: The vendor aggregates for the vendor_* features. Loaded from disk with the models.
+        cache: An optional prediction_cache.PredictionCache. Only rows that are not
+            cached are scored.
+        version: The model_version of the given models, required to use the cache
+            with models that were not loaded from disk.
+
+    Returns:
+        tuple: (predicted_hours, predicted_cost) as float32 numpy arrays.
+    """
+    if hours_model is None or cost_model is None:
+        hours_model, cost_model = load_models()
+        if hours_model is None:
+            return None, None
+        pipeline = load_pipeline()
+        version = model_version()
+        vendor_stats = load_vendor_stats()
+    if cache is not None and version is None:
+        raise ValueError("predict_batch needs the model version to use a cache with already loaded models.")
+
+    input_df = read_records(data)
+    feature_names = hours_model.get_booster().feature_names
+
+    def score(X):
+        # Build the DMatrix once and share it between both models.
+        dmatrix = xgb.DMatrix(X, feature_names=feature_names)
+        return hours_model.get_booster().predict(dmatrix), cost_model.get_booster().predict(dmatrix)
+
+    with instrumentation.stage('predict', rows_in=len(input_df)) as record:
+        X = prepare_features(input_df, feature_names, pipeline, vendor_stats)
+        if cache is not None:
+            predicted_hours, predicted_cost = cache.predict(X, version, score)
+        else:
+            predicted_hours, predicted_cost = score(X)
+        record.rows_out = len(predicted_hours)
+    return predicted_hours, predicted_cost
+
+def load_multi_model(model_dir="."):
+    """Loads the multi-output model written by `train_model.py --mode multi`. Returns None if missing."""
+    try:
+        return joblib.load(os.path.join(model_dir, 'multi_model.pkl'))
+    except FileNotFoundError:
+        logger.error("Error: multi_model.pkl not found. Please run 'train_model.py --mode multi' first.")
+        return None
+
+def predict_batch_multi(data, multi_model=None, pipeline=None, vendor_stats=None):
+    """
+    Same as predict_batch, but both targets come from one pass over a single
+    multi-output model. The pipeline and vendor_stats are loaded from disk with the
+    model if it is not given.
+
+    Returns:
+        tuple: (predicted_hours, predicted_cost) as float32 numpy arrays.
+    """
+    if multi_model is None:
+        multi_model = load_multi_model()
+        if multi_model is None:
+            return None, None
+        pipeline = load_pipeline()
+        vendor_stats = load_vendor_stats()
+
+    input_df = read_records(data)
+    feature_names = multi_model.get_booster().feature_names
+    X = prepare_features(input_df, feature_names, pipeline, vendor_stats)
+    predictions = multi_model.get_booster().predict(xgb.DMatrix(X, feature_names=feature_names))
+    return predictions[:, 0], predictions[:, 1]
+
+def predict_new_project(project_data, cache=None):
     """
     Loads the trained models and predicts the hours and cost for new project data.
 
     Args:
         project_data (dict): A dictionary containing the features of a new project.
+        cache: An optional prediction_cache.PredictionCache. A quote that was already
+            scored by the same models is answered from the cache.
     """
-    print("--- New Project Prediction ---")
+    logger.info("--- New Project Prediction ---")
 
-    # 1. Load the trained models
+    # 1. Load the trained models (only the first time, or after they were retrained)
     try:
-        hours_model = joblib.load('hours_model.pkl')
-        cost_model = joblib.load('cost_model.pkl')
-        print("Successfully loaded 'hours_model.pkl' and 'cost_model.pkl'.")
+        hours_model, cost_model, pipeline, version = load_resident_models()
+        logger.info(f"Using models version {version}.")
     except FileNotFoundError:
-        print("Error: Model files not found. Please run train_model.py first.")
+        logger.error("Error: Model files not found. Please run train_model.py first.")
         return
 
     # 2. Prepare the input data
-    # The input dictionary needs to be converted into a pandas DataFrame
-    # with the same columns that the model was trained on.
-    
-    # Create a DataFrame from the input dictionary
-    input_df = pd.DataFrame([project_data])
-
-    # One-hot encode the 'project_type' to match the training data format
-    # We need to add all possible project type columns and set them to 0
-    # This ensures the model sees the exact same feature set.
-    all_project_types = ['type_咨询服务', 'type_市场推广', 'type_硬件采购', 'type_系统集成', 'type_软件开发']
-    
-    # Get the one-hot encoded column name for the new project's type
-    current_project_type_col = f"type_{project_data['project_type']}"
-
-    for p_type in all_project_types:
-        if p_type == current_project_type_col:
-            input_df[p_type] = [True]
-        else:
-            input_df[p_type] = [False]
-            
-    # Drop the original categorical column
-    input_df = input_df.drop(columns=['project_type'])
-
-    # Ensure the column order is the same as in the training data
-    # This is crucial for the model to work correctly.
-    # We can get the expected feature order from one of the models.
-    # Note: This assumes both models were trained on the same feature set.
+    # The fitted preprocessing pipeline saved with the models turns the raw dict
+    # into the exact feature set and column order the models were trained on.
     expected_features = hours_model.get_booster().feature_names
-    
-    # Add any missing columns with a default value (e.g., 0)
-    for col in expected_features:
-        if col not in input_df.columns:
-            input_df[col] = 0
-            
-    # Reorder columns to match the model's expectation
-    input_df = input_df[expected_features]
-    
-    print("\nInput features prepared for prediction:")
-    print(input_df.to_string())
-
-    # 3. Make predictions
-    predicted_hours = hours_model.predict(input_df)
-    predicted_cost = cost_model.predict(input_df)
+    with instrumentation.stage('predict', rows_in=1) as record:
+        X = prepare_features(pd.DataFrame([project_data]), expected_features, pipeline, load_resident_vendor_stats())
+
+        # Formatting the table costs more than the prediction, so only when it is shown
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("\nInput features prepared for prediction:")
+            logger.info(pd.DataFrame(X, columns=expected_features).to_string())
+
+        # 3. Make predictions
+        def score(X):
+            dmatrix = xgb.DMatrix(X, feature_names=expected_features)
+            return hours_model.get_booster().predict(dmatrix), cost_model.get_booster().predict(dmatrix)
+
+        if cache is not None:
+            predicted_hours, predicted_cost = cache.predict(X, version, score)
+            logger.info(f"Prediction cache: {cache.stats()}")
+        else:
+            predicted_hours, predicted_cost = score(X)
+        record.rows_out = len(predicted_hours)
 
     # 4. Display the results
-    print("\n--- AI Prediction Results ---")
-    print(f"Predicted Reasonable Effort: {predicted_hours[0]:.2f} hours")
-    print(f"Predicted Reasonable Cost: {predicted_cost[0]:.2f} (in 10k currency units)")
-    print("-----------------------------")
+    logger.info("\n--- AI Prediction Results ---")
+    logger.info(f"Predicted Reasonable Effort: {predicted_hours[0]:.2f} hours")
+    logger.info(f"Predicted Reasonable Cost: {predicted_cost[0]:.2f} (in 10k currency units)")
+    logger.info("-----------------------------")
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # --- Define a Sample New Project ---
     # You can change these values to test different scenarios.
     # This project is a 'software development' project.
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+CACHE_FILE = "./prediction_cache.sqlite"
+# When the SQLite cache is full it is trimmed to this fraction of max_size, so the
+# table is only counted and trimmed once every few thousand writes
+TRIM_TO = 0.9
+
+def row_keys(X, version):
+    """
+    One cache key per row: a hash of the aligned float32 feature vector and the
+    model version, so entries of older models can never be returned.
+    """
+    # Adding 0.0 turns -0.0 into 0.0 so equal vectors hash equally
+    X = np.ascontiguousarray(X, dtype=np.float32) + np.float32(0.0)
+    prefix = version.encode('utf-8')
+    return [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in X]
+
+class PredictionCache:
+    """
+    In-process cache of (hours, cost) predictions with a bounded LRU size and a
+    time-to-live. Entries are keyed by row_keys, and everything is dropped as soon
+    as a different model version is seen, so retrained models invalidate it.
+    """
+
+    def __init__(self, max_size=100_000, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._entries = OrderedDict()  # key -> (hours, cost, expires_at)
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_many(self, keys, version):
+        """Returns an (n, 2) array of cached predictions, NaN where there is no entry."""
+        self._check_version(version)
+        values = np.full((len(keys), 2), np.nan, dtype=np.float32)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                values[i] = entry[:2]
+        return values
+
+    def put_many(self, keys, values, version):
+        self._check_version(version)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, (hours, cost) in zip(keys, values.tolist()):
+                self._entries[key] = (hours, cost, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit/miss counters for sizing the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self),
+            'max_size': self.max_size,
+        }
+
+    def predict(self, X, version, predict_fn):
+        """
+        Returns (hours, cost) for the feature matrix X. Only the rows without a
+        cache entry are passed to predict_fn(X) -> (hours, cost); their results
+        are then stored.
+        """
+        keys = row_keys(X, version)
+        values = self.get_many(keys, version)
+        missing = np.flatnonzero(np.isnan(values[:, 0]))
+        self._count(len(keys) - len(missing), len(missing))
+        if len(missing):
+            hours, cost = predict_fn(np.asarray(X)[missing])
+            values[missing] = np.column_stack([hours, cost])
+            self.put_many([keys[i] for i in missing], values[missing], version)
+        return values[:, 0], values[:, 1]
+
+class SQLitePredictionCache(PredictionCache):
+    """
+    PredictionCache stored in a SQLite file, so several worker processes share the
+    same entries. LRU order is kept with a last-access timestamp, and the hit/miss
+    counters are kept in the database as well, totalled over all processes.
+
+    Each process keeps an upper bound of the table size (its last count plus the
+    rows it wrote since), and only counts and trims the table, dropping expired and
+    least recently used entries down to TRIM_TO * max_size, once that bound passes
+    max_size. Other processes' writes are picked up at the next count.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_size=1_000_000, ttl=24 * 3600.0):
+        super().__init__(max_size, ttl)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key BLOB PRIMARY KEY, version TEXT, hours REAL, cost REAL, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+        self._size_bound = len(self)
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction, rolled back if anything in it fails. Call with self._lock held."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _check_version(self, version):
+        if version != self.version:
+            # Another process may still be writing entries of the old version;
+            # they are never read again and are removed by the next purge.
+            self.version = version
+            with self._lock:
+                self._conn.execute("DELETE FROM predictions WHERE version != ?", (version,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM predictions")
+
+    def get_many(self, keys, version):
+        self._check_version(version)
+        values = np.full((len(keys), 2), np.nan, dtype=np.float32)
+        if not keys:
+            return values
+        now = time.time()
+        positions = {key: i for i, key in enumerate(keys)}
+        found = []
+        with self._lock:
+            # SQLite limits the number of query parameters, so look keys up in chunks
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, hours, cost FROM predictions WHERE expires_at >= ? AND key IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk],
+                ).fetchall()
+                for key, hours, cost in rows:
+                    values[positions[key]] = (hours, cost)
+                    found.append((now, key))
+            if found:
+                with self._transaction() as conn:
+                    conn.executemany("UPDATE predictions SET accessed_at = ? WHERE key = ?", found)
+        return values
+
+    def put_many(self, keys, values, version):
+        self._check_version(version)
+        now = time.time()
+        rows = [(key, version, hours, cost, now + self.ttl, now) for key, (hours, cost) in zip(keys, values.tolist())]
+        with self._lock, self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._size_bound += len(rows)
+            if self._size_bound > self.max_size:
+                self._trim(conn, now)
+
+    def _trim(self, conn, now):
+        conn.execute("DELETE FROM predictions WHERE expires_at < ?", (now,))
+        size = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        target = int(self.max_size * TRIM_TO)
+        if size > self.max_size:
+            conn.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY accessed_at LIMIT ?)",
+                (size - target,),
+            )
+            size = target
+        self._size_bound = size
+
+    def _count(self, hits, misses):
+        super()._count(hits, misses)
+        with self._lock, self._transaction() as conn:
+            conn.executemany("UPDATE counters SET value = value + ? WHERE name = ?", [(hits, 'hits'), (misses, 'misses')])
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def stats(self):
+        """Hit/miss counters of this process, plus the totals of every process sharing the file."""
+        stats = super().stats()
+        totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = totals['hits'] + totals['misses']
+        stats.update({
+            'shared_hits': totals['hits'],
+            'shared_misses': totals['misses'],
+            'shared_hit_rate': totals['hits'] / lookups if lookups else 0.0,
+            'path': os.path.abspath(self.path),
+        })
+        return stats
+
+    def close(self):
+        self._conn.close()
+
+def create_cache(kind='memory', path=CACHE_FILE, max_size=None, ttl=None):
+    """Creates an in-process ('memory') or shared on-disk ('sqlite') prediction cache, or None for 'none'."""
+    if kind == 'none':
+        return None
+    options = {key: value for key, value in (('max_size', max_size), ('ttl', ttl)) if value is not None}
+    if kind == 'sqlite':
+        return SQLitePredictionCache(path, **options)
+    return PredictionCache(**options)
@@ -0,0 +1,104 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from data_processor import TECH_STACK_OPTIONS, encode_tech_stack
+
+PIPELINE_FILE = "preprocessing.json"
+
+class FeaturePipeline:
+    """
+    The fitted preprocessing shared by training and serving: feature order, the
+    project type and technology vocabularies and the imputation medians.
+    train_model saves it next to the models as preprocessing.json and predict loads
+    it, so raw quote records are turned into the exact feature matrix the models
+    were trained on.
+    """
+
+    def __init__(self, feature_names, project_types=(), tech_stack_options=TECH_STACK_OPTIONS, medians=None):
+        self.feature_names = list(feature_names)
+        self.project_types = list(project_types)
+        self.tech_stack_options = list(tech_stack_options)
+        self.medians = dict(medians or {})
+
+        # Precompute the column positions used by transform
+        self._index = {name: i for i, name in enumerate(self.feature_names)}
+        self._type_positions = np.array([self._index.get(f"type_{t}", -1) for t in self.project_types], dtype=np.int64)
+        self._tech_positions = np.array([self._index.get(f"tech_{t}", -1) for t in self.tech_stack_options], dtype=np.int64)
+        self._median_vector = np.array([self.medians.get(name, 0.0) for name in self.feature_names], dtype=np.float32)
+
+    @classmethod
+    def fit(cls, features):
+        """
+        Fits the pipeline on the training features (the output of
+        data_processor.select_features).
+        """
+        feature_names = features.columns.tolist()
+        medians = features.median()
+        return cls(
+            feature_names=feature_names,
+            project_types=[col[len('type_'):] for col in feature_names if col.startswith('type_')],
+            medians={col: float(value) for col, value in medians.items() if pd.notna(value)},
+        )
+
+    def transform(self, df):
+        """
+        Turns raw quote records into the model's float32 feature matrix in one
+        vectorized pass. 'project_type' and 'technology_stack' are encoded with the
+        fitted vocabularies, project_duration_days is derived from the dates if
+        needed, missing values are filled with the fitted medians and features
+        that are not in the input at all are 0.
+        """
+        X = np.zeros((len(df), len(self.feature_names)), dtype=np.float32)
+
+        # 1. Features given directly
+        present = [col for col in df.columns if col in self._index]
+        if present:
+            X[:, [self._index[col] for col in present]] = df[present].to_numpy(dtype=np.float32, na_value=np.nan)
+
+        # 2. One-hot project type
+        if 'project_type' in df.columns and len(self.project_types):
+            codes = pd.Categorical(df['project_type'], categories=self.project_types).codes
+            rows = np.flatnonzero(codes >= 0)
+            positions = self._type_positions[codes[rows]]
+            X[rows[positions >= 0], positions[positions >= 0]] = 1
+
+        # 3. Technology stack count and multi-hot columns
+        if 'technology_stack' in df.columns:
+            num_technologies, tech_columns = encode_tech_stack(df['technology_stack'].reset_index(drop=True), self.tech_stack_options)
+            known = self._tech_positions >= 0
+            X[:, self._tech_positions[known]] = tech_columns.to_numpy()[:, known]
+            if 'num_technologies' in self._index and 'num_technologies' not in df.columns:
+                X[:, self._index['num_technologies']] = num_technologies
+
+        # 4. Project duration from the dates
+        if ('project_duration_days' in self._index and 'project_duration_days' not in df.columns
+                and {'start_date', 'end_date'} <= set(df.columns)):
+            duration = (pd.to_datetime(df['end_date']) - pd.to_datetime(df['start_date'])).dt.days
+            X[:, self._index['project_duration_days']] = duration.to_numpy(dtype=np.float32, na_value=np.nan)
+
+        # 5. Median imputation
+        missing_rows, missing_cols = np.nonzero(np.isnan(X))
+        X[missing_rows, missing_cols] = self._median_vector[missing_cols]
+        return X
+
+    def to_dict(self):
+        return {
+            'feature_names': self.feature_names,
+            'project_types': self.project_types,
+            'tech_stack_options': self.tech_stack_options,
+            'medians': self.medians,
+        }
+
+    def save(self, path=PIPELINE_FILE):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path=PIPELINE_FILE):
+        with open(path) as f:
+            state = json.load(f)
+        # Pipelines saved by older versions also stored unused per-feature dtypes
+        state.pop('dtypes', None)
+        return cls(**state)
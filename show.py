@@ -1,9 +1,27 @@
-import joblib
-import xgboost as xgb
-import matplotlib.pyplot as plt
+import argparse
 
-model = joblib.load("cost_model.pkl")
-xgb.plot_tree(model, tree_idx=0, rankdir='LR')
+from explain_model import IMPORTANCE_TYPES, ModelExplainer
+from model_server import ModelRegistry
 
-plt.savefig("tree_0.png", dpi=500)
-print("Tree saved as tree_0.png")
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Shows which features drive the hours and cost models.")
+parser.add_argument('--importance', choices=IMPORTANCE_TYPES, default='total_gain', help="Global importance type.")
+parser.add_argument('--top-k', type=int, default=15, help="Features listed per model.")
+parser.add_argument('--tree', type=int, help="Also render this tree of the cost model to tree_<n>.png (slow).")
+args = parser.parse_args()
+
+registry = ModelRegistry(".")
+if registry.version is None:
+    raise SystemExit(1)
+importance = ModelExplainer(registry).importance(args.importance)
+for target, scores in importance.items():
+    print(f"--- {target} model: feature importance by {args.importance} ---")
+    for name, value in sorted(scores.items(), key=lambda item: -item[1])[:args.top_k]:
+        print(f"{name:<32} {value:6.1%}")
+
+if args.tree is not None:
+    import matplotlib.pyplot as plt
+    import xgboost as xgb
+
+    xgb.plot_tree(registry.cost_booster, tree_idx=args.tree, rankdir='LR')
+    plt.savefig(f"tree_{args.tree}.png", dpi=500)
+    print(f"Tree saved as tree_{args.tree}.png")
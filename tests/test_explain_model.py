@@ -0,0 +1,64 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+import predict
+from explain_model import ModelExplainer
+from model_server import ModelRegistry
+
+FEATURES = ['function_points', 'team_size', 'demand_stability_rating']
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    # No vendor aggregates: only the columns below are features
+    monkeypatch.setattr(predict, 'load_vendor_stats', lambda *args, **kwargs: None)
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(1, 100, (200, len(FEATURES))), columns=FEATURES)
+    for name, y in [('hours_model.pkl', X['function_points'] * 2 + X['team_size']),
+                    ('cost_model.pkl', X['team_size'] * 0.5 + X['demand_stability_rating'])]:
+        model = xgb.XGBRegressor(n_estimators=10, max_depth=3)
+        model.fit(X, y)
+        joblib.dump(model, tmp_path / name)
+    return ModelRegistry(str(tmp_path))
+
+
+def records():
+    return [
+        {'function_points': 10, 'team_size': 3, 'demand_stability_rating': 2.5},
+        {'function_points': 80, 'team_size': 12, 'demand_stability_rating': 4.0},
+        {'function_points': 45, 'team_size': 7},
+    ]
+
+
+def test_contributions_have_one_column_per_feature_plus_bias(registry):
+    contributions = ModelExplainer(registry).contributions(records())
+    assert set(contributions) == {'hours', 'cost'}
+    for values in contributions.values():
+        assert values.shape == (3, len(FEATURES) + 1)
+
+
+def test_explanations_add_up_to_the_predictions(registry):
+    explainer = ModelExplainer(registry)
+    explanations, version = explainer.explain(records(), top_k=None, with_version=True)
+    hours, cost = registry.predict(records())
+
+    assert version == registry.version
+    assert len(explanations) == 3
+    for explanation, expected in [(explanations[i], {'hours': hours[i], 'cost': cost[i]}) for i in range(3)]:
+        for target in ('hours', 'cost'):
+            entry = explanation[target]
+            assert set(entry['contributions']) == set(FEATURES)
+            total = sum(entry['contributions'].values()) + entry['bias']
+            assert total == pytest.approx(entry['prediction'], rel=1e-4, abs=1e-3)
+            assert entry['prediction'] == pytest.approx(float(expected[target]), rel=1e-4, abs=1e-3)
+
+
+def test_cached_contributions_match_fresh_ones(registry):
+    explainer = ModelExplainer(registry)
+    first = explainer.contributions(records())
+    second = explainer.contributions(records())
+    for target in ('hours', 'cost'):
+        np.testing.assert_allclose(first[target], second[target])
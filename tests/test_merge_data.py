@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from data_processor import merge_data
+
+
+def make_frames():
+    projects = pd.DataFrame({'id': [1, 2, 3], 'project_type': ['web', 'mobile', 'web'], 'team_size': [4, 6, 3]})
+    quotes = pd.DataFrame({'id': [10, 11, 12, 13], 'project_id': [1, 1, 2, 3], 'vendor_id': [7, 8, 7, 9],
+                           'quoted_hours': [100.0, 120.0, 80.0, 50.0]})
+    actuals = pd.DataFrame({'id': [20, 21], 'project_id': [1, 2], 'actual_effort_hours': [110.0, 90.0]})
+    return projects, quotes, actuals
+
+
+def test_merge_keeps_quotes_of_completed_projects():
+    projects, quotes, actuals = make_frames()
+    merged = merge_data(projects, quotes, actuals)
+    assert merged['quote_id'].tolist() == [10, 11, 12]
+    assert merged['project_type'].tolist() == ['web', 'web', 'mobile']
+    assert merged['actual_effort_hours'].tolist() == [110.0, 110.0, 90.0]
+
+
+def test_merge_keeps_open_projects_when_asked():
+    projects, quotes, actuals = make_frames()
+    merged = merge_data(projects, quotes, actuals, completed_only=False)
+    assert merged['quote_id'].tolist() == [10, 11, 12, 13]
+    assert pd.isna(merged['actual_effort_hours'].iloc[3])
+
+
+def test_duplicate_project_ids_raise_value_error():
+    projects, quotes, actuals = make_frames()
+    projects = pd.concat([projects, projects.iloc[[1]]], ignore_index=True)
+    with pytest.raises(ValueError, match=r"Duplicate projects id values: \[2\]"):
+        merge_data(projects, quotes, actuals)
+
+
+def test_duplicate_actuals_raise_value_error():
+    projects, quotes, actuals = make_frames()
+    actuals = pd.concat([actuals, actuals.iloc[[0]]], ignore_index=True)
+    with pytest.raises(ValueError, match=r"Duplicate project_actuals project_id values: \[1\]"):
+        merge_data(projects, quotes, actuals)
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from prediction_cache import PredictionCache, SQLitePredictionCache, TRIM_TO, row_keys
+
+
+def make_rows(n, start=0):
+    return np.arange(start, start + n, dtype=np.float32).reshape(-1, 1) * np.ones((1, 3), dtype=np.float32)
+
+
+class CountingModel:
+    """predict_fn that records the rows it is asked to score."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, X):
+        self.calls.append(X.copy())
+        return X[:, 0] * 10, X[:, 0] * 100
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        yield PredictionCache(max_size=100, ttl=60)
+    else:
+        cache = SQLitePredictionCache(str(tmp_path / 'cache.sqlite'), max_size=100, ttl=60)
+        yield cache
+        cache.close()
+
+
+def test_row_keys_depend_on_values_and_version():
+    X = np.array([[1.0, 0.0], [1.0, -0.0], [2.0, 0.0]], dtype=np.float32)
+    keys = row_keys(X, 'v1')
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+    assert row_keys(X, 'v2')[0] != keys[0]
+
+
+def test_predict_only_scores_missing_rows(cache):
+    model = CountingModel()
+    hours, cost = cache.predict(make_rows(3), 'v1', model)
+    np.testing.assert_allclose(hours, [0, 10, 20])
+    np.testing.assert_allclose(cost, [0, 100, 200])
+
+    hours, cost = cache.predict(make_rows(4, start=1), 'v1', model)
+    np.testing.assert_allclose(hours, [10, 20, 30, 40])
+    np.testing.assert_allclose(cost, [100, 200, 300, 400])
+    assert len(model.calls) == 2
+    np.testing.assert_array_equal(model.calls[1][:, 0], [3, 4])
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_new_version_invalidates_entries(cache):
+    model = CountingModel()
+    cache.predict(make_rows(3), 'v1', model)
+    cache.predict(make_rows(3), 'v2', model)
+    assert len(model.calls) == 2
+    assert len(cache) == 3
+
+
+def test_expired_entries_are_missed():
+    cache = PredictionCache(ttl=-1)
+    model = CountingModel()
+    cache.predict(make_rows(2), 'v1', model)
+    cache.predict(make_rows(2), 'v1', model)
+    assert len(model.calls) == 2
+    assert cache.hits == 0
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = PredictionCache(max_size=3)
+    keys = row_keys(make_rows(4), 'v1')
+    values = np.ones((4, 2), dtype=np.float32)
+    cache.put_many(keys[:3], values[:3], 'v1')
+    cache.get_many(keys[:1], 'v1')
+    cache.put_many(keys[3:], values[3:], 'v1')
+    found = ~np.isnan(cache.get_many(keys, 'v1')[:, 0])
+    assert found.tolist() == [True, False, True, True]
+
+
+def test_sqlite_cache_trims_below_max_size(tmp_path):
+    cache = SQLitePredictionCache(str(tmp_path / 'cache.sqlite'), max_size=10)
+    keys = row_keys(make_rows(12), 'v1')
+    cache.put_many(keys, np.ones((12, 2), dtype=np.float32), 'v1')
+    assert len(cache) == int(10 * TRIM_TO)
+    cache.close()
+
+
+def test_sqlite_cache_rolls_back_failed_writes(tmp_path):
+    cache = SQLitePredictionCache(str(tmp_path / 'cache.sqlite'))
+    keys = row_keys(make_rows(2), 'v1')
+    values = np.ones((2, 2), dtype=np.float32)
+    with pytest.raises(Exception):
+        cache.put_many([keys[0], object()], values, 'v1')
+    assert len(cache) == 0
+    cache.put_many(keys, values, 'v1')
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    first, second = SQLitePredictionCache(path), SQLitePredictionCache(path)
+    model = CountingModel()
+    first.predict(make_rows(3), 'v1', model)
+    hours, _ = second.predict(make_rows(3), 'v1', model)
+    np.testing.assert_allclose(hours, [0, 10, 20])
+    assert len(model.calls) == 1
+    stats = second.stats()
+    assert (stats['hits'], stats['misses']) == (3, 0)
+    assert (stats['shared_hits'], stats['shared_misses']) == (3, 3)
+    first.close()
+    second.close()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+import train_model
+from data_processor import save_processed
+
+NUM_PROJECTS = 100
+QUOTES_PER_PROJECT = 2
+
+
+def processed_rows(actual_ids):
+    """Processed rows of the projects with actuals, ordered by quote id like data_processor writes them."""
+    rng = np.random.default_rng(0)
+    projects = np.arange(1, NUM_PROJECTS + 1)
+    function_points = rng.uniform(10, 500, NUM_PROJECTS)
+    team_size = rng.integers(2, 20, NUM_PROJECTS).astype(float)
+    rows = []
+    for p in projects:
+        if p not in actual_ids:
+            continue
+        for q in range(QUOTES_PER_PROJECT):
+            hours = function_points[p - 1] * 1.5 + team_size[p - 1] * 20
+            rows.append({
+                'quote_id': (p - 1) * QUOTES_PER_PROJECT + q + 1, 'project_id': p, 'vendor_id': q + 1,
+                'actual_id': actual_ids[p], 'function_points': function_points[p - 1],
+                'team_size': team_size[p - 1], 'quoted_hours': hours * (1 + 0.1 * q),
+                'target_hours': hours, 'target_cost': hours * 0.015,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_update_trains_on_actuals_added_for_earlier_projects(tmp_path, monkeypatch):
+    monkeypatch.setitem(train_model.XGB_PARAMS, 'n_estimators', 5)
+    monkeypatch.setitem(train_model.XGB_PARAMS, 'n_jobs', 1)
+    matrix_dir, model_dir, history_dir = tmp_path / 'matrix', tmp_path / 'models', tmp_path / 'history'
+    model_dir.mkdir()
+
+    # 80 projects, picked at random, get actuals first; the other 20 get them later
+    # with higher actual ids, so their rows land between already trained ones
+    order = np.random.default_rng(1).permutation(np.arange(1, NUM_PROJECTS + 1))
+    actual_ids = {int(p): i + 1 for i, p in enumerate(order)}
+    first = {p: a for p, a in actual_ids.items() if a <= 80}
+
+    save_processed(processed_rows(first), str(matrix_dir))
+    entry = train_model.train_update(str(matrix_dir), str(model_dir), str(history_dir))
+    assert entry['kind'] == 'full'
+    assert entry['last_actual_id'] == 80
+    trained_first = processed_rows(first)
+    assert entry['rows_trained'] == int((trained_first['actual_id'] % train_model.HOLDOUT_EVERY != 0).sum())
+
+    everything = processed_rows(actual_ids)
+    save_processed(everything, str(matrix_dir))
+    entry = train_model.train_update(str(matrix_dir), str(model_dir), str(history_dir))
+    assert entry['kind'] == 'update'
+    assert entry['last_actual_id'] == NUM_PROJECTS
+    new_rows = (everything['actual_id'] > 80) & (everything['actual_id'] % train_model.HOLDOUT_EVERY != 0)
+    assert entry['rows_trained'] == int(new_rows.sum())
+    # The new rows really are in the middle of the file, not appended at the end
+    new_positions = np.flatnonzero(everything['actual_id'].to_numpy() > 80)
+    assert new_positions.min() < len(trained_first)
+
+    assert train_model.train_update(str(matrix_dir), str(model_dir), str(history_dir)) is None
+
+
+def test_update_needs_actual_ids(tmp_path, monkeypatch):
+    monkeypatch.setitem(train_model.XGB_PARAMS, 'n_estimators', 5)
+    data = processed_rows({p: p for p in range(1, NUM_PROJECTS + 1)}).drop(columns=['actual_id'])
+    path = tmp_path / 'processed.csv'
+    data.to_csv(path, index=False)
+    assert train_model.train_update(str(path), str(tmp_path), str(tmp_path / 'history')) is None
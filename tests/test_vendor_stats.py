@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import predict
+from data_processor import merge_data
+from preprocessing import FeaturePipeline
+from vendor_stats import ALL_TYPES, VendorStats, _sums_before, historical_features
+
+
+def make_frames():
+    # Vendor 7 wins projects 1 and 2 (ratios 1.1 and 1.3), vendor 8 wins project 3 (0.8);
+    # project 4 is still open and one of its quotes has no vendor
+    projects = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'project_type': ['web', 'web', 'mobile', 'web'],
+        'start_date': ['2024-01-01', '2024-03-01', '2024-05-01', '2024-07-01'],
+        'end_date': ['2024-02-01', '2024-04-01', '2024-06-01', None],
+    })
+    quotes = pd.DataFrame({
+        'id': [1, 2, 3, 4, 5, 6, 7],
+        'project_id': [1, 1, 2, 2, 3, 4, 4],
+        'vendor_id': pd.array([7, 8, 7, 8, 8, 7, None], dtype='Int64'),
+        'quoted_hours': [100.0, 120.0, 200.0, 150.0, 50.0, 80.0, 90.0],
+        'actual_contract_price': [1000.0, 1200.0, 2000.0, 2500.0, 500.0, 800.0, 900.0],
+    })
+    actuals = pd.DataFrame({'id': [1, 2, 3], 'project_id': [1, 2, 3], 'actual_effort_hours': [110.0, 260.0, 40.0]})
+    return projects, quotes, actuals
+
+
+def test_incremental_updates_match_one_pass():
+    projects, quotes, actuals = make_frames()
+    one_pass = VendorStats()
+    assert one_pass.update(projects, quotes, actuals) == (7, 3)
+
+    incremental = VendorStats()
+    incremental.update(projects, quotes[quotes['id'] <= 3], actuals[actuals['id'] <= 1])
+    assert incremental.update(projects, quotes, actuals) == (4, 2)
+    assert incremental.update(projects, quotes, actuals) == (0, 0)
+    assert (incremental.last_quote_id, incremental.last_actual_id) == (7, 3)
+
+    pd.testing.assert_frame_equal(incremental.table.sort_index(), one_pass.table.sort_index(), check_dtype=False)
+    vendor_7 = one_pass.table.loc[(7, ALL_TYPES)]
+    assert vendor_7['quote_count'] == 3
+    assert vendor_7['win_count'] == 2
+    assert vendor_7['ratio_count'] == 2
+    assert vendor_7['ratio_mean'] == pytest.approx(1.2)
+    # M2 is the sum of squared deviations: 2 * 0.1 ** 2
+    assert vendor_7['ratio_m2'] == pytest.approx(0.02)
+
+
+def test_sums_before_only_count_strictly_earlier_days():
+    event_keys = [np.array([1, 1, 1, 2])]
+    event_days = np.array([0, 5, 10, 5])
+    event_values = np.array([[1.0], [2.0], [4.0], [8.0]])
+    sums = _sums_before(event_keys, event_days, event_values, [np.array([1, 1, 2, 3])], np.array([5, 11, 5, 100]))
+    np.testing.assert_allclose(sums[:, 0], [1.0, 7.0, 0.0, 0.0])
+
+
+def test_historical_features_exclude_own_quote_and_outcome():
+    projects, quotes, actuals = make_frames()
+    merged = merge_data(projects, quotes, actuals, completed_only=False)
+    features = historical_features(merged, projects, quotes, actuals).set_index('quote_id')
+
+    # Nothing happened before the first project
+    assert features.loc[1, 'vendor_quote_count'] == 0
+    assert np.isnan(features.loc[1, 'vendor_win_rate'])
+    # Project 2 sees project 1 (quoted and completed earlier), but not its own win
+    assert features.loc[3, 'vendor_quote_count'] == 1
+    assert features.loc[3, 'vendor_win_rate'] == 1
+    assert features.loc[3, 'vendor_ratio_mean'] == pytest.approx(1.1)
+    assert np.isnan(features.loc[3, 'vendor_ratio_std'])
+    # Vendor 8 quoted twice before project 3 and won neither
+    assert features.loc[5, 'vendor_quote_count'] == 2
+    assert features.loc[5, 'vendor_win_rate'] == 0
+    assert np.isnan(features.loc[5, 'vendor_type_ratio_mean'])
+    # Project 4 sees both of vendor 7's wins
+    assert features.loc[6, 'vendor_ratio_mean'] == pytest.approx(1.2)
+    assert features.loc[6, 'vendor_ratio_std'] == pytest.approx(np.sqrt(0.02), rel=1e-5)
+    # A quote without a vendor gets missing values
+    assert features.loc[7, ['vendor_quote_count', 'vendor_win_rate', 'vendor_ratio_mean']].isna().all()
+
+
+def test_add_features_looks_up_current_stats():
+    projects, quotes, actuals = make_frames()
+    stats = VendorStats()
+    stats.update(projects, quotes, actuals)
+    records = pd.DataFrame({'vendor_id': [7, 99, None], 'project_type': ['web', 'web', 'web']})
+    features = stats.add_features(records)
+
+    assert features['vendor_quote_count'].tolist() == [3, 0, 0]
+    assert features.loc[0, 'vendor_win_rate'] == pytest.approx(2 / 3)
+    assert features.loc[0, 'vendor_type_ratio_mean'] == pytest.approx(1.2)
+    assert features.loc[1:, ['vendor_win_rate', 'vendor_ratio_mean', 'vendor_type_ratio_std']].isna().all().all()
+
+    # A quote that is already counted is left out of its vendor's count
+    counted = stats.add_features(pd.DataFrame({'quote_id': [6, 8], 'vendor_id': [7, 7], 'project_type': ['web', 'web']}))
+    assert counted['vendor_quote_count'].tolist() == [2, 3]
+
+
+def test_absent_vendor_features_get_the_medians():
+    feature_names = ['quoted_hours', 'vendor_win_rate', 'vendor_ratio_mean']
+    pipeline = FeaturePipeline(feature_names, medians={'quoted_hours': 90.0, 'vendor_win_rate': 0.5, 'vendor_ratio_mean': 1.2})
+    X = predict.prepare_features(pd.DataFrame({'quoted_hours': [100.0]}), feature_names, pipeline)
+    np.testing.assert_allclose(X, [[100.0, 0.5, 1.2]])
+
+
+def test_resident_stats_are_reloaded_when_saved_again(tmp_path):
+    projects, quotes, actuals = make_frames()
+    stats_dir = str(tmp_path / 'vendor_stats')
+    assert predict.load_resident_vendor_stats(stats_dir) is None
+
+    stats = VendorStats()
+    stats.update(projects, quotes[quotes['id'] <= 3], actuals[actuals['id'] <= 1])
+    stats.save(stats_dir)
+    first = predict.load_resident_vendor_stats(stats_dir)
+    assert predict.load_resident_vendor_stats(stats_dir) is first
+    assert first.last_quote_id == 3
+
+    stats.update(projects, quotes, actuals)
+    stats.save(stats_dir)
+    # Make sure the files look changed even on filesystems with coarse timestamps
+    state_path = os.path.join(stats_dir, 'state.json')
+    mtime = os.stat(state_path).st_mtime_ns + 10 ** 9
+    os.utime(state_path, ns=(mtime, mtime))
+    reloaded = predict.load_resident_vendor_stats(stats_dir)
+    assert reloaded is not first
+    assert reloaded.last_quote_id == 7
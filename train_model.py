@@ -1,5 +1,14 @@
 
 
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+
 import pandas as pd
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
@@ -8,112 +17,644 @@ import joblib
 import numpy as np
 import matplotlib.pyplot as plt
 
-def train():
+from data_processor import MATRIX_DIR, TARGET_COLUMNS, iter_processed_batches, load_feature_matrix, select_features
+import instrumentation
+import predict
+from preprocessing import PIPELINE_FILE, FeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+# Every HOLDOUT_EVERY-th row is held out for evaluation in streaming and update mode
+HOLDOUT_EVERY = 5
+# Rows sampled from the whole stream for the streaming pipeline's medians
+PIPELINE_SAMPLE_ROWS = 200_000
+
+# Update mode: every trained model version is archived in HISTORY_DIR, an update adds
+# UPDATE_ROUNDS trees on the new rows and every REFRESH_EVERY-th run retrains from scratch
+HISTORY_DIR = "./model_history"
+HISTORY_FILE = "history.json"
+UPDATE_ROUNDS = 10
+REFRESH_EVERY = 10
+MODEL_TARGETS = [('target_hours', 'hours_model.pkl'), ('target_cost', 'cost_model.pkl')]
+
+# Hyperparameters shared by the hours and cost models
+XGB_PARAMS = {
+    'objective': 'reg:squarederror',
+    'n_estimators': 100,
+    'learning_rate': 0.1,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+    'n_jobs': -1, # Use all available CPU cores
+}
+
+def booster_params(params=XGB_PARAMS):
     """
-    Loads the processed data, trains two separate XGBoost models for hours and cost,
-    evaluates them, and saves the trained models to disk.
+    Translates XGBRegressor keyword arguments into parameters for the native xgb.train API.
+
+    Returns:
+        tuple: (params dict, num_boost_round)
     """
-    print("Starting model training process...")
+    params = dict(params)
+    num_boost_round = params.pop('n_estimators')
+    params['seed'] = params.pop('random_state')
+    n_jobs = params.pop('n_jobs')
+    params['nthread'] = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    params['tree_method'] = 'hist'
+    return params, num_boost_round
 
-    # 1. Load the processed data
+def to_regressor(booster, params=XGB_PARAMS):
+    """Wraps a native Booster in an XGBRegressor so it is saved and loaded like the other models."""
+    model = xgb.XGBRegressor(**params)
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    return model
+
+def default_data_path():
+    """The binary feature matrix if data_processor.py has written one, otherwise the CSV file."""
+    if os.path.exists(os.path.join(MATRIX_DIR, 'schema.json')):
+        logger.info(f"No data path given, using the binary feature matrix in {MATRIX_DIR}.")
+        return MATRIX_DIR
+    logger.info(f"No data path given and no binary feature matrix in {MATRIX_DIR}, using ./processed_modeling_data.csv.")
+    return "./processed_modeling_data.csv"
+
+def split_rows(num_rows, test_size=0.2, seed=42):
+    """
+    The seeded random train/test split of the rows, the same one train_test_split
+    gives for the feature frame. Both models (and both targets of train_shared) use it.
+    Indexing the memory-mapped matrix with these copies the rows, which is fine at the
+    sizes trained in memory.
+
+    Returns:
+        tuple: (train, test) row index arrays.
+    """
+    return train_test_split(np.arange(num_rows), test_size=test_size, random_state=seed)
+
+def save_pipeline(features, output_dir="."):
+    """Fits the preprocessing pipeline on the training features and saves it next to the models."""
+    FeaturePipeline.fit(features).save(os.path.join(output_dir, PIPELINE_FILE))
+    logger.info(f"Preprocessing pipeline saved to {PIPELINE_FILE}")
+
+def load_training_data(data_path):
+    """
+    Loads the model features and targets from one of the processed data formats:
+    the binary feature matrix directory (memory-mapped, not copied), a feature store
+    directory, or a CSV file.
+
+    Returns:
+        tuple: (features, targets) DataFrames, or (None, None) if the data is missing.
+    """
     try:
-        data_path = "./processed_modeling_data.csv"
-        df = pd.read_csv(data_path)
-        print(f"Successfully loaded processed data from {data_path}. Shape: {df.shape}")
+        if os.path.exists(os.path.join(data_path, 'schema.json')):
+            X, y, schema = load_feature_matrix(data_path)
+            features = pd.DataFrame(X, columns=schema['feature_names'], copy=False)
+            targets = pd.DataFrame(y, columns=schema['target_names'], copy=False)
+            logger.info(f"Successfully memory-mapped feature matrix from {data_path}. Shape: {X.shape}")
+            return features, targets
+        if os.path.isdir(data_path):
+            from feature_store import read_store
+            df = read_store(data_path)
+        else:
+            df = pd.read_csv(data_path)
+        logger.info(f"Successfully loaded processed data from {data_path}. Shape: {df.shape}")
     except FileNotFoundError:
-        print(f"Error: Processed data file not found at {data_path}.")
-        print("Please run the data_processor.py script first.")
-        return
+        logger.error(f"Error: Processed data file not found at {data_path}.")
+        logger.info("Please run the data_processor.py script first.")
+        return None, None
 
-    # 2. Define features (X) and targets (y)
-    # We will predict 'target_hours' and 'target_cost'
-    # All other columns will be used as features, except for identifiers
-    
     # Ensure target columns exist
     if 'target_hours' not in df.columns or 'target_cost' not in df.columns:
-        print("Error: Target columns ('target_hours', 'target_cost') not found in the data.")
+        logger.error("Error: Target columns ('target_hours', 'target_cost') not found in the data.")
+        return None, None
+
+    # Drop identifiers and targets, keep only numeric features (XGBoost requires numeric inputs)
+    return select_features(df), df[TARGET_COLUMNS]
+
+@instrumentation.instrumented('train')
+def train(data_path=None, output_dir="."):
+    """
+    Loads the processed data, trains two separate XGBoost models for hours and cost,
+    evaluates them, and saves the trained models to disk.
+
+    Returns:
+        dict: Training wall-clock time and the MAE of each model on the test split.
+    """
+    logger.info("Starting model training process...")
+    data_path = data_path or default_data_path()
+
+    # 1. Load the processed data
+    # 2. Define features (X) and targets (y)
+    # We will predict 'target_hours' and 'target_cost'
+    # All other numeric columns will be used as features, except for identifiers
+    features, targets = load_training_data(data_path)
+    if features is None:
         return
 
-    # Drop non-feature columns
-    features = df.drop(columns=['target_hours', 'target_cost', 'quote_id', 'project_id', 'vendor_id', 'actual_id', 'status'])
-    
-    # Ensure all feature columns are numeric. This is a safeguard.
-    # XGBoost requires numeric inputs.
-    features = features.select_dtypes(include=np.number)
-    
-    target_hours = df['target_hours']
-    target_cost = df['target_cost']
+    target_hours = targets['target_hours']
+    target_cost = targets['target_cost']
 
-    print(f"Features for training: {features.columns.tolist()}")
+    logger.info(f"Features for training: {features.columns.tolist()}")
+    save_pipeline(features, output_dir)
+    # One split for both models
+    train_rows, test_rows = split_rows(len(features))
 
     # --- Train Model for Target Hours ---
-    print("\n--- Training model for Target Hours ---")
+    logger.info("\n--- Training model for Target Hours ---")
     
     # 3. Split data for the hours model
-    X_train_h, X_test_h, y_train_h, y_test_h = train_test_split(
-        features, target_hours, test_size=0.2, random_state=42
-    )
+    X_train_h, X_test_h = features.iloc[train_rows], features.iloc[test_rows]
+    y_train_h, y_test_h = target_hours.iloc[train_rows], target_hours.iloc[test_rows]
 
     # 4. Initialize and train the XGBoost Regressor for hours
-    hours_model = xgb.XGBRegressor(
-        objective='reg:squarederror',
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42,
-        n_jobs=-1 # Use all available CPU cores
-    )
+    hours_model = xgb.XGBRegressor(**XGB_PARAMS, callbacks=instrumentation.xgb_callbacks('hours_model'))
     
-    print("Training hours model...")
-    hours_model.fit(X_train_h, y_train_h)
+    logger.info("Training hours model...")
+    start = time.perf_counter()
+    with instrumentation.stage('train.hours_model', rows_in=len(X_train_h)):
+        hours_model.fit(X_train_h, y_train_h)
+    # The timing callback is not part of the saved model
+    hours_model.set_params(callbacks=None)
+    train_seconds = time.perf_counter() - start
 
     # 5. Evaluate the hours model
-    print("Evaluating hours model...")
+    logger.info("Evaluating hours model...")
     predictions_h = hours_model.predict(X_test_h)
     mae_h = mean_absolute_error(y_test_h, predictions_h)
-    print(f"Mean Absolute Error (Hours Model): {mae_h:.2f} hours")
+    logger.info(f"Mean Absolute Error (Hours Model): {mae_h:.2f} hours")
 
     # 6. Save the hours model
-    joblib.dump(hours_model, 'hours_model.pkl')
-    print("Hours model saved to hours_model.pkl")
+    joblib.dump(hours_model, os.path.join(output_dir, 'hours_model.pkl'))
+    logger.info("Hours model saved to hours_model.pkl")
 
     # --- Train Model for Target Cost ---
-    print("\n--- Training model for Target Cost ---")
+    logger.info("\n--- Training model for Target Cost ---")
 
     # 3. Split data for the cost model
-    X_train_c, X_test_c, y_train_c, y_test_c = train_test_split(
-        features, target_cost, test_size=0.2, random_state=42
-    )
+    X_train_c, X_test_c = features.iloc[train_rows], features.iloc[test_rows]
+    y_train_c, y_test_c = target_cost.iloc[train_rows], target_cost.iloc[test_rows]
 
     # 4. Initialize and train the XGBoost Regressor for cost
-    cost_model = xgb.XGBRegressor(
-        objective='reg:squarederror',
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42,
-        n_jobs=-1
-    )
+    cost_model = xgb.XGBRegressor(**XGB_PARAMS, callbacks=instrumentation.xgb_callbacks('cost_model'))
     
-    print("Training cost model...")
-    cost_model.fit(X_train_c, y_train_c)
+    logger.info("Training cost model...")
+    start = time.perf_counter()
+    with instrumentation.stage('train.cost_model', rows_in=len(X_train_c)):
+        cost_model.fit(X_train_c, y_train_c)
+    # The timing callback is not part of the saved model
+    cost_model.set_params(callbacks=None)
+    train_seconds += time.perf_counter() - start
 
     # 5. Evaluate the cost model
-    print("Evaluating cost model...")
+    logger.info("Evaluating cost model...")
     predictions_c = cost_model.predict(X_test_c)
     mae_c = mean_absolute_error(y_test_c, predictions_c)
-    print(f"Mean Absolute Error (Cost Model): {mae_c:.2f} (in 10k units)")
+    logger.info(f"Mean Absolute Error (Cost Model): {mae_c:.2f} (in 10k units)")
 
     # 6. Save the cost model
-    joblib.dump(cost_model, 'cost_model.pkl')
-    print("Cost model saved to cost_model.pkl")
+    joblib.dump(cost_model, os.path.join(output_dir, 'cost_model.pkl'))
+    logger.info("Cost model saved to cost_model.pkl")
     
-    print("\nModel training process complete!")
+    logger.info("\nModel training process complete!")
+    return {'train_seconds': train_seconds, 'mae_hours': mae_h, 'mae_cost': mae_c}
+
+@instrumentation.instrumented('train')
+def train_shared(multi_output=False, data_path=None, output_dir="."):
+    """
+    Trains the hours and cost models from a single feature matrix.
+
+    The data is split once and quantized once into a QuantileDMatrix that both targets share.
+    With multi_output=True a single multi-target model (multi_strategy='multi_output_tree')
+    is trained instead, so both targets come from one tree traversal at inference time.
+
+    Returns:
+        dict: Training wall-clock time and the MAE of each target on the test split.
+    """
+    logger.info(f"Starting shared model training process (multi_output={multi_output})...")
+    data_path = data_path or default_data_path()
+
+    features, targets = load_training_data(data_path)
+    if features is None:
+        return None
+    feature_names = features.columns.tolist()
+    save_pipeline(features, output_dir)
+
+    # One split for both targets (the two splits in train() are identical anyway)
+    X, y = features.to_numpy(dtype=np.float32), targets.to_numpy(dtype=np.float32)
+    train_rows, test_rows = split_rows(len(X))
+    X_train, X_test, y_train, y_test = X[train_rows], X[test_rows], y[train_rows], y[test_rows]
+
+    params, num_boost_round = booster_params()
+    start = time.perf_counter()
+
+    if multi_output:
+        params['multi_strategy'] = 'multi_output_tree'
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train, feature_names=feature_names)
+        logger.info("Training multi-output model...")
+        multi_booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, callbacks=instrumentation.xgb_callbacks('multi_model'))
+        train_seconds = time.perf_counter() - start
+        predictions = multi_booster.predict(xgb.DMatrix(X_test, feature_names=feature_names))
+        joblib.dump(to_regressor(multi_booster), os.path.join(output_dir, 'multi_model.pkl'))
+        logger.info("Multi-output model saved to multi_model.pkl")
+    else:
+        # The quantized matrix is built once; only the label is swapped between targets.
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train[:, 0], feature_names=feature_names)
+        logger.info("Training hours model...")
+        hours_booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, callbacks=instrumentation.xgb_callbacks('hours_model'))
+        dtrain.set_label(y_train[:, 1])
+        logger.info("Training cost model...")
+        cost_booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, callbacks=instrumentation.xgb_callbacks('cost_model'))
+        train_seconds = time.perf_counter() - start
+
+        dtest = xgb.DMatrix(X_test, feature_names=feature_names)
+        predictions = np.column_stack([hours_booster.predict(dtest), cost_booster.predict(dtest)])
+        joblib.dump(to_regressor(hours_booster), os.path.join(output_dir, 'hours_model.pkl'))
+        joblib.dump(to_regressor(cost_booster), os.path.join(output_dir, 'cost_model.pkl'))
+        logger.info("Models saved to hours_model.pkl and cost_model.pkl")
+
+    mae_h = mean_absolute_error(y_test[:, 0], predictions[:, 0])
+    mae_c = mean_absolute_error(y_test[:, 1], predictions[:, 1])
+    logger.info(f"Training time: {train_seconds:.2f}s")
+    logger.info(f"Mean Absolute Error (Hours): {mae_h:.2f} hours")
+    logger.info(f"Mean Absolute Error (Cost): {mae_c:.2f} (in 10k units)")
+
+    logger.info("\nModel training process complete!")
+    return {'train_seconds': train_seconds, 'mae_hours': mae_h, 'mae_cost': mae_c}
+
+class ProcessedDataIter(xgb.DataIter):
+    """
+    Feeds the processed data to XGBoost batch by batch, so an external-memory
+    DMatrix can be built from data that does not fit in RAM.
+
+    Rows are assigned to the training or holdout side by their position in the data
+    (every HOLDOUT_EVERY-th row is holdout), which is stable across passes.
+    """
+
+    def __init__(self, data_path, feature_names, target, holdout=False, batch_size=100_000, cache_prefix=None):
+        self.data_path = data_path
+        self.feature_names = feature_names
+        self.target = target
+        self.holdout = holdout
+        self.batch_size = batch_size
+        self.num_rows = 0
+        self._batches = None
+        self._offset = 0
+        self._rows_this_pass = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._batches = None
+        self._offset = 0
+        self._rows_this_pass = 0
+
+    def next_batch(self):
+        """Returns the next (X, y) pair for this side of the split, or None at the end of the data."""
+        if self._batches is None:
+            self._batches = iter_processed_batches(self.data_path, self.batch_size)
+        for batch in self._batches:
+            in_holdout = (self._offset + np.arange(len(batch))) % HOLDOUT_EVERY == 0
+            self._offset += len(batch)
+            batch = batch[in_holdout == self.holdout]
+            if len(batch):
+                X = batch.reindex(columns=self.feature_names, fill_value=0).to_numpy(dtype=np.float32)
+                return X, batch[self.target].to_numpy(dtype=np.float32)
+        return None
+
+    def next(self, input_data):
+        batch = self.next_batch()
+        if batch is None:
+            return False
+        X, y = batch
+        # XGBoost makes several passes over the data; count the rows of one pass
+        self._rows_this_pass += len(X)
+        self.num_rows = max(self.num_rows, self._rows_this_pass)
+        input_data(data=X, label=y, feature_names=self.feature_names)
+        return True
+
+def fit_streaming_pipeline(data_path, batch_size=100_000, sample_rows=PIPELINE_SAMPLE_ROWS, seed=42):
+    """
+    Fits the preprocessing pipeline in one pass over the processed data. The feature
+    columns (and so the project type and technology vocabularies) are those of every
+    batch, in the order they are first seen; the medians come from a uniform sample of
+    sample_rows rows of the whole stream, so memory stays bounded.
+
+    Returns:
+        FeaturePipeline: The fitted pipeline, or None if there is no data.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    sample, sample_keys = None, None
+    for batch in iter_processed_batches(data_path, batch_size):
+        features = select_features(batch)
+        columns.update(dict.fromkeys(features.columns))
+        # Reservoir sampling: every row gets a random key and the smallest sample_rows keys are kept
+        keys = rng.random(len(features))
+        if sample is not None:
+            # Columns a batch does not have (one-hot values it never takes) are 0
+            features = pd.concat([sample.reindex(columns=list(columns), fill_value=0),
+                                  features.reindex(columns=list(columns), fill_value=0)], ignore_index=True)
+            keys = np.concatenate([sample_keys, keys])
+        if len(features) > sample_rows:
+            keep = np.argpartition(keys, sample_rows)[:sample_rows]
+            features, keys = features.iloc[keep].reset_index(drop=True), keys[keep]
+        sample, sample_keys = features, keys
+    if sample is None:
+        return None
+    return FeaturePipeline.fit(sample.reindex(columns=list(columns), fill_value=0))
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _holdout_mae(booster, iterator):
+    """Streams the holdout rows through the booster and returns the mean absolute error."""
+    iterator.reset()
+    total_error, num_rows = 0.0, 0
+    while (batch := iterator.next_batch()) is not None:
+        X, y = batch
+        predictions = booster.inplace_predict(X)
+        total_error += float(np.abs(predictions - y).sum())
+        num_rows += len(y)
+    return total_error / max(num_rows, 1)
+
+@instrumentation.instrumented('train')
+def train_streaming(data_path=None, output_dir=".", batch_size=100_000, compare=False):
+    """
+    Trains the hours and cost models without loading the processed data into memory.
+    Batches (CSV chunks, Parquet row groups or slices of the feature matrix) are fed
+    through a DataIter into an external-memory DMatrix.
+
+    Reports peak RSS and throughput. With compare=True the same split is also trained
+    in memory so the accuracy of both paths can be compared.
+
+    Returns:
+        dict: Training time, throughput, peak RSS and holdout MAE per target.
+    """
+    logger.info("Starting streaming model training process...")
+    data_path = data_path or default_data_path()
+    try:
+        pipeline = fit_streaming_pipeline(data_path, batch_size)
+    except FileNotFoundError:
+        pipeline = None
+    if pipeline is None:
+        logger.error(f"Error: Processed data not found at {data_path}.")
+        logger.info("Please run the data_processor.py script first.")
+        return None
+    pipeline.save(os.path.join(output_dir, PIPELINE_FILE))
+    logger.info(f"Preprocessing pipeline saved to {PIPELINE_FILE}")
+    feature_names = pipeline.feature_names
+    logger.info(f"Features for training: {feature_names}")
+
+    params, num_boost_round = booster_params()
+    ExtMemMatrix = getattr(xgb, 'ExtMemQuantileDMatrix', xgb.DMatrix)
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for target, model_file in [('target_hours', 'hours_model.pkl'), ('target_cost', 'cost_model.pkl')]:
+            logger.info(f"\n--- Streaming training for {target} ---")
+            train_iter = ProcessedDataIter(data_path, feature_names, target, batch_size=batch_size,
+                                           cache_prefix=os.path.join(cache_dir, target))
+            start = time.perf_counter()
+            dtrain = ExtMemMatrix(train_iter)
+            booster = xgb.train(params, dtrain, num_boost_round=num_boost_round,
+                                callbacks=instrumentation.xgb_callbacks(model_file[:-len('.pkl')]))
+            train_seconds = time.perf_counter() - start
+            del dtrain
+
+            mae = _holdout_mae(booster, ProcessedDataIter(data_path, feature_names, target, holdout=True, batch_size=batch_size))
+            joblib.dump(to_regressor(booster), os.path.join(output_dir, model_file))
+            results[target] = {
+                'train_seconds': train_seconds,
+                'rows': train_iter.num_rows,
+                'rows_per_sec': train_iter.num_rows / train_seconds,
+                'mae': mae,
+            }
+            logger.info(f"Trained on {train_iter.num_rows} rows in {train_seconds:.2f}s "
+                        f"({train_iter.num_rows / train_seconds:,.0f} rows/sec). Holdout MAE: {mae:.2f}")
+            logger.info(f"Model saved to {model_file}")
+
+    results['peak_rss_mb'] = _peak_rss_mb()
+    logger.info(f"\nPeak RSS: {results['peak_rss_mb']:.1f} MB")
+
+    if compare:
+        # Same params and split, but with the whole dataset in memory
+        logger.info("\n--- In-memory training on the same split for comparison ---")
+        features, targets = load_training_data(data_path)
+        in_holdout = np.arange(len(features)) % HOLDOUT_EVERY == 0
+        X = features.to_numpy(dtype=np.float32)
+        for target in TARGET_COLUMNS:
+            y = targets[target].to_numpy(dtype=np.float32)
+            booster = xgb.train(params, xgb.DMatrix(X[~in_holdout], label=y[~in_holdout]), num_boost_round=num_boost_round)
+            in_memory_mae = float(np.abs(booster.inplace_predict(X[in_holdout]) - y[in_holdout]).mean())
+            results[target]['in_memory_mae'] = in_memory_mae
+            logger.info(f"{target}: streaming MAE {results[target]['mae']:.2f} vs in-memory MAE {in_memory_mae:.2f}")
+        logger.info(f"Peak RSS including in-memory training: {_peak_rss_mb():.1f} MB")
+
+    logger.info("\nModel training process complete!")
+    return results
+
+def load_history(history_dir=HISTORY_DIR):
+    """The entries of every model version trained in update mode, oldest first."""
+    try:
+        with open(os.path.join(history_dir, HISTORY_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def _save_history(history, history_dir):
+    tmp_path = os.path.join(history_dir, HISTORY_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, os.path.join(history_dir, HISTORY_FILE))
+
+def _load_actual_ids(data_path):
+    """
+    The actual_id of every processed row, in the order of load_training_data. For the
+    binary feature matrix they come from the data.parquet that save_processed writes next
+    to it. Raises FileNotFoundError, KeyError or ValueError if there is no actual_id column.
+    """
+    if os.path.exists(os.path.join(data_path, 'schema.json')):
+        return pd.read_parquet(os.path.join(data_path, 'data.parquet'), columns=['actual_id'])['actual_id'].to_numpy()
+    if os.path.isdir(data_path):
+        from feature_store import read_store
+        return read_store(data_path, columns=['actual_id'])['actual_id'].to_numpy()
+    return pd.read_csv(data_path, usecols=['actual_id'])['actual_id'].to_numpy()
+
+def _load_boosters(model_dir):
+    """The hours and cost boosters in model_dir, or None if they are missing."""
+    hours_model, cost_model = predict.load_models(model_dir)
+    if hours_model is None:
+        return None
+    return {'target_hours': hours_model.get_booster(), 'target_cost': cost_model.get_booster()}
+
+def _mae(booster, X, y):
+    return float(np.abs(booster.inplace_predict(X) - y).mean())
+
+@instrumentation.instrumented('train')
+def train_update(data_path=None, output_dir=".", history_dir=HISTORY_DIR, update_rounds=UPDATE_ROUNDS,
+                 refresh_every=REFRESH_EVERY, full_refresh=False, compare=False):
+    """
+    Updates the hours and cost models with the rows added since they were last
+    trained, by continuing to boost the saved models (xgb_model=) for update_rounds
+    more trees on only those rows. New rows are the ones with an actual_id above the
+    last one trained on, wherever they are in the processed data (actuals that arrive
+    for earlier projects end up between rows that were already trained on).
+
+    The models are retrained from scratch instead on the first run, when full_refresh
+    is set, when the features changed and after refresh_every updates. Every version
+    is archived in history_dir together with history.json, which records what was
+    trained and the holdout MAE. An update also logs its drift: the holdout MAE
+    compared with the last full retrain, evaluated on the same (current) holdout. With
+    compare=True a full retrain on the same rows is run as the reference instead.
+
+    Rows are held out by actual_id, so all quotes of a project stay on the same side
+    and a row never moves between the training rows and the holdout.
+
+    Returns:
+        dict: The history entry of the new version, or None if there was nothing to do.
+    """
+    logger.info("Starting incremental model training process...")
+    data_path = data_path or default_data_path()
+    features, targets = load_training_data(data_path)
+    if features is None:
+        return None
+    feature_names = features.columns.tolist()
+    try:
+        actual_ids = _load_actual_ids(data_path)
+    except (FileNotFoundError, KeyError, ValueError):
+        logger.error(f"Error: No actual_id column in {data_path}; update mode needs it to find the new rows.")
+        logger.info("Please run the data_processor.py script again.")
+        return None
+    if len(actual_ids) != len(features):
+        logger.error(f"Error: {len(actual_ids)} actual_ids for {len(features)} rows in {data_path}.")
+        return None
+    in_holdout = actual_ids % HOLDOUT_EVERY == 0
+
+    os.makedirs(history_dir, exist_ok=True)
+    history = load_history(history_dir)
+    last = history[-1] if history else None
+    full_versions = [entry for entry in history if entry['kind'] == 'full']
+    updates_since_refresh = len(history) - 1 - history.index(full_versions[-1]) if full_versions else 0
+    current = None if last is None else _load_boosters(output_dir)
+
+    if current is None or full_refresh:
+        kind = 'full'
+    elif current['target_hours'].feature_names != feature_names:
+        logger.info("The features changed since the last training run, retraining from scratch.")
+        kind = 'full'
+    elif last.get('last_actual_id') is None:
+        logger.info("The last training run did not record its actual_ids, retraining from scratch.")
+        kind = 'full'
+    elif updates_since_refresh >= refresh_every:
+        logger.info(f"{updates_since_refresh} updates since the last full retrain, retraining from scratch.")
+        kind = 'full'
+    else:
+        kind = 'update'
+
+    if kind == 'full':
+        train_rows = ~in_holdout
+    else:
+        train_rows = (actual_ids > last['last_actual_id']) & ~in_holdout
+        if not train_rows.any():
+            logger.info("No new rows since the last training run, nothing to do.")
+            return None
+    logger.info(f"{'Full retrain' if kind == 'full' else 'Update'} on {int(train_rows.sum())} of {len(features)} rows.")
+
+    X = features.to_numpy(dtype=np.float32)
+    X_train, X_holdout = X[train_rows], X[in_holdout]
+    params, num_boost_round = booster_params()
+    if kind == 'full':
+        save_pipeline(features, output_dir)
+
+    entry = {
+        'version': len(history) + 1,
+        'kind': kind,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'num_rows': len(features),
+        'last_actual_id': int(actual_ids.max()),
+        'rows_trained': int(train_rows.sum()),
+        'train_seconds': 0.0,
+        'num_trees': {},
+        'holdout_mae': {},
+    }
+    reference = None
+    if kind == 'update':
+        reference = _load_boosters(os.path.join(history_dir, f"v{full_versions[-1]['version']:04d}")) if full_versions else None
+        entry['reference_mae'] = {}
+    if compare:
+        entry['full_retrain_mae'] = {}
+        entry['full_retrain_seconds'] = 0.0
+
+    for target, model_file in MODEL_TARGETS:
+        y = targets[target].to_numpy(dtype=np.float32)
+        dtrain = xgb.DMatrix(X_train, label=y[train_rows], feature_names=feature_names)
+        start = time.perf_counter()
+        if kind == 'full':
+            booster = xgb.train(params, dtrain, num_boost_round=num_boost_round,
+                                callbacks=instrumentation.xgb_callbacks(model_file[:-len('.pkl')]))
+        else:
+            booster = xgb.train(params, dtrain, num_boost_round=update_rounds, xgb_model=current[target],
+                                callbacks=instrumentation.xgb_callbacks(model_file[:-len('.pkl')]))
+        entry['train_seconds'] += time.perf_counter() - start
+        del dtrain
+        joblib.dump(to_regressor(booster), os.path.join(output_dir, model_file))
+
+        entry['num_trees'][target] = booster.num_boosted_rounds()
+        entry['holdout_mae'][target] = _mae(booster, X_holdout, y[in_holdout])
+        message = f"{target}: {entry['num_trees'][target]} trees, holdout MAE {entry['holdout_mae'][target]:.3f}"
+        if reference is not None:
+            entry['reference_mae'][target] = _mae(reference[target], X_holdout, y[in_holdout])
+            message += (f", last full retrain {entry['reference_mae'][target]:.3f} "
+                        f"(drift {entry['holdout_mae'][target] - entry['reference_mae'][target]:+.3f})")
+        if compare:
+            # What retraining from scratch on the same rows would have cost and scored
+            start = time.perf_counter()
+            full_booster = xgb.train(params, xgb.DMatrix(X[~in_holdout], label=y[~in_holdout], feature_names=feature_names),
+                                     num_boost_round=num_boost_round)
+            entry['full_retrain_seconds'] += time.perf_counter() - start
+            entry['full_retrain_mae'][target] = _mae(full_booster, X_holdout, y[in_holdout])
+            message += f", full retrain now {entry['full_retrain_mae'][target]:.3f}"
+        logger.info(message)
+
+    # Archive this version
+    entry['model_version'] = predict.model_version(output_dir)
+    version_dir = os.path.join(history_dir, f"v{entry['version']:04d}")
+    os.makedirs(version_dir, exist_ok=True)
+    for name in predict.model_files(output_dir):
+        shutil.copy2(os.path.join(output_dir, name), os.path.join(version_dir, name))
+    history.append(entry)
+    _save_history(history, history_dir)
+
+    logger.info(f"Training time: {entry['train_seconds']:.2f}s"
+                + (f" (full retrain: {entry['full_retrain_seconds']:.2f}s)" if compare else ""))
+    logger.info(f"Models saved to hours_model.pkl and cost_model.pkl and archived as version {entry['version']} in {version_dir}")
+    return entry
 
 if __name__ == '__main__':
-    train()
+    parser = argparse.ArgumentParser(description="Trains the hours and cost models.")
+    parser.add_argument('--mode', choices=['separate', 'shared', 'multi', 'streaming', 'update'], default='separate',
+                        help="separate: two independent models (default); shared: two models trained from one "
+                             "QuantileDMatrix; multi: one multi-output model saved to multi_model.pkl; "
+                             "streaming: two models trained from an external-memory DMatrix fed in batches; "
+                             "update: continue boosting the saved models on the new rows, with versioned history.")
+    parser.add_argument('--data', help="Processed data: a CSV file, the binary feature matrix directory or a feature "
+                                       "store directory (default: the binary feature matrix if present, else the CSV file).")
+    parser.add_argument('--batch-size', type=int, default=100_000, help="Rows per batch in streaming mode.")
+    parser.add_argument('--compare', action='store_true', help="In streaming mode, also train in memory and compare accuracy; "
+                                                               "in update mode, also retrain from scratch and compare.")
+    parser.add_argument('--full-refresh', action='store_true', help="In update mode, retrain from scratch now.")
+    parser.add_argument('--refresh-every', type=int, default=REFRESH_EVERY,
+                        help="In update mode, retrain from scratch after this many updates.")
+    parser.add_argument('--update-rounds', type=int, default=UPDATE_ROUNDS, help="Trees added to each model by an update.")
+    parser.add_argument('--history-dir', default=HISTORY_DIR, help="Where update mode archives the model versions.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.mode == 'separate':
+        train(args.data)
+    elif args.mode == 'streaming':
+        train_streaming(args.data, batch_size=args.batch_size, compare=args.compare)
+    elif args.mode == 'update':
+        train_update(args.data, history_dir=args.history_dir, update_rounds=args.update_rounds,
+                     refresh_every=args.refresh_every, full_refresh=args.full_refresh, compare=args.compare)
+    else:
+        train_shared(multi_output=args.mode == 'multi', data_path=args.data)
 
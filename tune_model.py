@@ -0,0 +1,186 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import KFold
+
+from data_processor import TARGET_COLUMNS
+from train_model import XGB_PARAMS, booster_params, default_data_path, load_training_data, save_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Search space around the hand-picked values in train_model.XGB_PARAMS
+PARAM_GRID = {
+    'max_depth': [3, 5, 7],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'subsample': [0.7, 0.8, 1.0],
+    'colsample_bytree': [0.7, 0.8, 1.0],
+    'min_child_weight': [1, 5],
+    'reg_lambda': [1, 5],
+}
+MAX_BOOST_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 20
+LEADERBOARD_FILE = "tuning_leaderboard.csv"
+
+# Per-worker state built once by _init_worker: the quantized data, the fold matrices and targets
+_WORKER = {}
+
+def candidate_params(search='random', num_trials=20, seed=42):
+    """The parameter combinations to try: the full PARAM_GRID, or num_trials random picks from it."""
+    keys = list(PARAM_GRID)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*PARAM_GRID.values())]
+    if search == 'grid':
+        return grid
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(grid), size=min(num_trials, len(grid)), replace=False)
+    return [grid[i] for i in picks]
+
+def _setup_worker(X, y, feature_names, num_folds, nthread, seed):
+    """
+    Quantizes the data once into a single QuantileDMatrix that every fold trains on,
+    with weight 0 for the rows it holds out. Each fold's validation rows get their own
+    QuantileDMatrix built with the bin cuts of the full one (ref=). All of it is reused
+    by every trial this worker runs, for both targets (only labels and weights are swapped).
+    """
+    dtrain = xgb.QuantileDMatrix(X, feature_names=feature_names)
+    folds = []
+    for train_index, valid_index in KFold(n_splits=num_folds, shuffle=True, random_state=seed).split(X):
+        weight = np.zeros(len(X), dtype=np.float32)
+        weight[train_index] = 1
+        dvalid = xgb.QuantileDMatrix(X[valid_index], ref=dtrain, feature_names=feature_names)
+        folds.append((weight, dvalid, valid_index))
+    _WORKER.update({'dtrain': dtrain, 'folds': folds, 'targets': y, 'nthread': nthread})
+
+def _init_worker(arrays_dir, feature_names, num_folds, nthread, seed):
+    """Memory-maps the features and targets written once by tune() and sets up this worker."""
+    X = np.load(os.path.join(arrays_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(arrays_dir, 'y.npy'), mmap_mode='r')
+    _setup_worker(X, y, feature_names, num_folds, nthread, seed)
+
+def _run_trial(trial_id, target, trial_params):
+    """Runs k-fold CV with early stopping for one parameter set. Returns a leaderboard row."""
+    start = time.perf_counter()
+    params, _ = booster_params({**XGB_PARAMS, **trial_params})
+    params.update({'nthread': _WORKER['nthread'], 'eval_metric': 'mae'})
+    y = np.asarray(_WORKER['targets'][:, TARGET_COLUMNS.index(target)])
+    dtrain = _WORKER['dtrain']
+    dtrain.set_label(y)
+
+    fold_maes, fold_rounds = [], []
+    for weight, dvalid, valid_index in _WORKER['folds']:
+        dtrain.set_weight(weight)
+        dvalid.set_label(y[valid_index])
+        booster = xgb.train(params, dtrain, num_boost_round=MAX_BOOST_ROUNDS, evals=[(dvalid, 'valid')],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        fold_maes.append(booster.best_score)
+        fold_rounds.append(booster.best_iteration + 1)
+
+    return {
+        'trial_id': trial_id,
+        'target': target,
+        **trial_params,
+        'cv_mae': float(np.mean(fold_maes)),
+        'cv_mae_std': float(np.std(fold_maes)),
+        'best_rounds': int(np.mean(fold_rounds)),
+        'trial_seconds': time.perf_counter() - start,
+    }
+
+def tune(data_path=None, search='random', num_trials=20, num_folds=5, workers=None, seed=42, output_dir="."):
+    """
+    Searches PARAM_GRID for both targets with k-fold CV and early stopping, spreading
+    trials over a process pool. The CPU cores are divided between concurrent trials
+    (workers) and the threads of each trial (nthread = cores // workers).
+
+    Writes the leaderboard to tuning_leaderboard.csv, retrains the best parameters of
+    each target on all data and saves them as hours_model.pkl/cost_model.pkl.
+
+    Returns:
+        pd.DataFrame: The leaderboard, best trial first per target.
+    """
+    logger.info("Starting hyperparameter search...")
+    data_path = data_path or default_data_path()
+    features, targets = load_training_data(data_path)
+    if features is None:
+        return None
+
+    cores = os.cpu_count()
+    workers = workers or cores
+    nthread = max(1, cores // workers)
+    candidates = candidate_params(search, num_trials, seed)
+    tasks = [(trial_id, target, params) for trial_id, params in enumerate(candidates) for target in TARGET_COLUMNS]
+    logger.info(f"{len(tasks)} trials ({len(candidates)} parameter sets x {len(TARGET_COLUMNS)} targets), "
+                f"{num_folds}-fold CV, {workers} concurrent trial(s) x {nthread} thread(s) on {cores} cores.")
+
+    start = time.perf_counter()
+    results = []
+    best_so_far = {}
+    time_to_best = {}
+
+    def record(result):
+        result['elapsed_seconds'] = time.perf_counter() - start
+        results.append(result)
+        target = result['target']
+        if target not in best_so_far or result['cv_mae'] < best_so_far[target]:
+            best_so_far[target] = result['cv_mae']
+            time_to_best[target] = result['elapsed_seconds']
+            logger.info(f"[{result['elapsed_seconds']:7.1f}s] New best for {target}: CV MAE {result['cv_mae']:.3f} (trial {result['trial_id']})")
+
+    X = features.to_numpy(dtype=np.float32)
+    y = targets[TARGET_COLUMNS].to_numpy(dtype=np.float32)
+    feature_names = features.columns.tolist()
+    if workers == 1:
+        _setup_worker(X, y, feature_names, num_folds, nthread, seed)
+        for task in tasks:
+            record(_run_trial(*task))
+        _WORKER.clear()
+    else:
+        # The data is loaded once here and written as .npy files that every worker
+        # memory-maps, so the workers share its pages instead of each parsing it again
+        with tempfile.TemporaryDirectory() as arrays_dir:
+            np.save(os.path.join(arrays_dir, 'X.npy'), X)
+            np.save(os.path.join(arrays_dir, 'y.npy'), y)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(arrays_dir, feature_names, num_folds, nthread, seed)) as executor:
+                futures = [executor.submit(_run_trial, *task) for task in tasks]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    leaderboard = pd.DataFrame(results).sort_values(['target', 'cv_mae']).reset_index(drop=True)
+    leaderboard.to_csv(os.path.join(output_dir, LEADERBOARD_FILE), index=False)
+    logger.info(f"\nLeaderboard saved to {LEADERBOARD_FILE}")
+
+    # Retrain the best parameters of each target on all the data
+    save_pipeline(features, output_dir)
+    for target, model_file in [('target_hours', 'hours_model.pkl'), ('target_cost', 'cost_model.pkl')]:
+        best = leaderboard[leaderboard['target'] == target].iloc[0]
+        best_params = {key: best[key].item() for key in PARAM_GRID}
+        model = xgb.XGBRegressor(**{**XGB_PARAMS, **best_params, 'n_estimators': int(best['best_rounds'])})
+        model.fit(features, targets[target])
+        joblib.dump(model, os.path.join(output_dir, model_file))
+        logger.info(f"{target}: CV MAE {best['cv_mae']:.3f}, {int(best['best_rounds'])} rounds, {json.dumps(best_params)}")
+        logger.info(f"  Time to best model: {time_to_best[target]:.1f}s. Saved to {model_file}")
+
+    logger.info(f"\nHyperparameter search complete in {time.perf_counter() - start:.1f}s.")
+    return leaderboard
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tunes the hours and cost model hyperparameters with k-fold CV.")
+    parser.add_argument('--data', help="Processed data (default: the binary feature matrix if present, else the CSV file).")
+    parser.add_argument('--search', choices=['random', 'grid'], default='random', help="Random picks from the grid, or the full grid.")
+    parser.add_argument('--trials', type=int, default=20, help="Parameter sets to try with --search random.")
+    parser.add_argument('--folds', type=int, default=5, help="Number of CV folds.")
+    parser.add_argument('--workers', type=int, help="Concurrent trials (default: one per core). Each trial gets cores // workers threads.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    tune(args.data, args.search, args.trials, args.folds, args.workers, args.seed)
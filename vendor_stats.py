@@ -0,0 +1,348 @@
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processor import load_data, merge_data
+
+logger = logging.getLogger(__name__)
+
+STATS_DIR = "./vendor_stats"
+STATS_FILE = "stats.parquet"
+STATE_FILE = "state.json"
+# project_type of the vendor-level rows, which aggregate over all project types
+ALL_TYPES = '*'
+STAT_COLUMNS = ['quote_count', 'win_count', 'ratio_count', 'ratio_mean', 'ratio_m2']
+VENDOR_FEATURES = ['vendor_quote_count', 'vendor_win_rate', 'vendor_ratio_mean', 'vendor_ratio_std',
+                   'vendor_type_ratio_mean', 'vendor_type_ratio_std']
+
+def _vendor_array(vendor_ids):
+    """vendor_id values as float64, NaN where missing or not a number."""
+    return pd.to_numeric(pd.Series(np.asarray(vendor_ids, dtype=object)), errors='coerce').to_numpy(dtype=np.float64)
+
+def _ratio(quoted_hours, actual_effort_hours):
+    """actual_effort_hours / quoted_hours, NaN where nothing (positive) was quoted."""
+    quoted_hours = np.asarray(quoted_hours, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(quoted_hours > 0, np.asarray(actual_effort_hours, dtype=np.float64) / quoted_hours, np.nan)
+
+def _features(vendor, by_type):
+    """
+    The VENDOR_FEATURES arrays from the per-vendor and per-(vendor, type) quote_count,
+    win_count, ratio_count, ratio_mean and ratio_m2 arrays.
+    """
+    features = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for prefix, stats in (('vendor', vendor), ('vendor_type', by_type)):
+            n = stats['ratio_count']
+            features[f'{prefix}_ratio_mean'] = np.where(n > 0, stats['ratio_mean'], np.nan)
+            features[f'{prefix}_ratio_std'] = np.where(n > 1, np.sqrt(np.maximum(stats['ratio_m2'], 0) / (n - 1)), np.nan)
+        features['vendor_win_rate'] = np.where(vendor['quote_count'] > 0, vendor['win_count'] / vendor['quote_count'], np.nan)
+    features['vendor_quote_count'] = vendor['quote_count']
+    return {name: np.asarray(features[name], dtype=np.float32) for name in VENDOR_FEATURES}
+
+def winning_quotes(merged):
+    """
+    The winning quote of every project in a merged frame: the one with the lowest
+    contract price, which is the quote the project's actuals were executed under.
+    """
+    return merged.sort_values('actual_contract_price', kind='stable').drop_duplicates('project_id')
+
+def _group_stats(vendor_ids, project_types, quote_count=None, win_count=None, ratio=None):
+    """Per (vendor_id, project_type) and per vendor (ALL_TYPES) sums and ratio moments of one batch."""
+    batch = pd.DataFrame({
+        'vendor_id': _vendor_array(vendor_ids),
+        'project_type': np.asarray(project_types, dtype=object).astype(str),
+        'quote_count': 0 if quote_count is None else quote_count,
+        'win_count': 0 if win_count is None else win_count,
+        'ratio': np.nan if ratio is None else ratio,
+    })
+    # Quotes without a (valid) vendor_id cannot be attributed to anyone
+    batch = batch[batch['vendor_id'].notna()].astype({'vendor_id': np.int64})
+    levels = [batch, batch.assign(project_type=ALL_TYPES)]
+    grouped = pd.concat(levels, ignore_index=True).groupby(['vendor_id', 'project_type'])
+    stats = grouped[['quote_count', 'win_count']].sum()
+    stats['ratio_count'] = grouped['ratio'].count()
+    stats['ratio_mean'] = grouped['ratio'].mean().fillna(0.0)
+    stats['ratio_m2'] = (grouped['ratio'].var(ddof=0) * stats['ratio_count']).fillna(0.0)
+    return stats
+
+def _combine(a, b):
+    """
+    Merges two tables of per-group (count, mean, M2) with Chan et al.'s pairwise
+    update, the batched form of Welford's online algorithm, so new rows are folded
+    in without revisiting the old ones.
+    """
+    if a.empty:
+        return b.astype(np.float64)
+    a, b = a.align(b, join='outer', fill_value=0)
+    n = a['ratio_count'] + b['ratio_count']
+    safe_n = n.where(n > 0, 1)
+    delta = b['ratio_mean'] - a['ratio_mean']
+    return pd.DataFrame({
+        'quote_count': a['quote_count'] + b['quote_count'],
+        'win_count': a['win_count'] + b['win_count'],
+        'ratio_count': n,
+        'ratio_mean': a['ratio_mean'] + delta * b['ratio_count'] / safe_n,
+        'ratio_m2': a['ratio_m2'] + b['ratio_m2'] + delta ** 2 * a['ratio_count'] * b['ratio_count'] / safe_n,
+    })
+
+class VendorStats:
+    """
+    Precomputed vendor aggregates: per vendor and per (vendor, project type), the
+    number of quotes, the number of won quotes and the running mean and variance of
+    actual_effort_hours / quoted_hours over the won, completed projects (how much a
+    vendor's quotes over- or under-run).
+
+    The table is updated incrementally as new quotes and actuals land and looked up
+    by a hash index on (vendor_id, project_type), so adding the features to a batch
+    costs O(1) per row.
+    """
+
+    def __init__(self, table=None, last_quote_id=0, last_actual_id=0):
+        if table is None:
+            index = pd.MultiIndex.from_arrays([np.array([], dtype=np.int64), np.array([], dtype=object)],
+                                              names=['vendor_id', 'project_type'])
+            table = pd.DataFrame({col: pd.Series(dtype=np.float64) for col in STAT_COLUMNS}, index=index)
+        self.table = table
+        self.last_quote_id = last_quote_id
+        self.last_actual_id = last_actual_id
+
+    def update(self, projects_df, quotes_df, actuals_df):
+        """
+        Folds the quotes and actuals added since the last update into the table.
+
+        Args:
+            projects_df, quotes_df, actuals_df: The full source tables. Only quotes with
+                an id above last_quote_id and actuals above last_actual_id are added.
+
+        Returns:
+            tuple: (new quotes, new actuals) counted.
+        """
+        new_quotes = quotes_df[quotes_df['id'] > self.last_quote_id]
+        new_actuals = actuals_df[actuals_df['id'] > self.last_actual_id]
+        batches = []
+
+        if len(new_quotes):
+            quoted = merge_data(projects_df, new_quotes, actuals_df, columns=['vendor_id', 'project_type'], completed_only=False)
+            batches.append(_group_stats(quoted['vendor_id'], quoted['project_type'], quote_count=1))
+
+        if len(new_actuals):
+            # The winners of the newly completed projects, among all of their quotes
+            project_quotes = quotes_df[quotes_df['project_id'].isin(new_actuals['project_id'])]
+            merged = merge_data(projects_df, project_quotes, new_actuals, columns=[
+                'project_id', 'vendor_id', 'project_type', 'quoted_hours', 'actual_contract_price', 'actual_effort_hours'])
+            winners = winning_quotes(merged)
+            quoted_hours = winners['quoted_hours'].to_numpy(dtype=np.float64)
+            ratio = _ratio(quoted_hours, winners['actual_effort_hours'])
+            batches.append(_group_stats(winners['vendor_id'], winners['project_type'], win_count=1, ratio=ratio))
+
+        for batch in batches:
+            self.table = _combine(self.table, batch)
+        if len(new_quotes):
+            self.last_quote_id = int(new_quotes['id'].max())
+        if len(new_actuals):
+            self.last_actual_id = int(new_actuals['id'].max())
+        return len(new_quotes), len(new_actuals)
+
+    def _lookup(self, vendor_ids, project_types):
+        """The stat columns of each (vendor_id, project_type) as arrays; 0 for unknown or missing vendors."""
+        vendor_ids = _vendor_array(vendor_ids)
+        rows = np.flatnonzero(~np.isnan(vendor_ids))
+        keys = pd.MultiIndex.from_arrays([vendor_ids[rows].astype(np.int64), np.asarray(project_types, dtype=object)[rows]])
+        positions = np.full(len(vendor_ids), -1, dtype=np.int64)
+        positions[rows] = self.table.index.get_indexer(keys)
+        found = positions >= 0
+        values = {}
+        for col in STAT_COLUMNS:
+            column = np.zeros(len(positions))
+            column[found] = self.table[col].to_numpy(dtype=np.float64)[positions[found]]
+            values[col] = column
+        return values
+
+    def add_features(self, df):
+        """
+        Returns df with the VENDOR_FEATURES columns added as of now, looked up by
+        'vendor_id' (and 'project_type' for the per-type columns). Unknown or missing
+        vendors get NaN, which is imputed downstream. A quote that is already counted
+        (quote_id up to last_quote_id) is left out of its own vendor's quote count, as
+        in historical_features.
+
+        This is the serving side; training rows get their features from
+        historical_features, which never includes a row's own outcome.
+        """
+        project_types = (df['project_type'].astype(str).to_numpy() if 'project_type' in df.columns
+                         else np.full(len(df), None, dtype=object))
+        vendor = self._lookup(df['vendor_id'], np.full(len(df), ALL_TYPES, dtype=object))
+        by_type = self._lookup(df['vendor_id'], project_types)
+        if 'quote_id' in df.columns:
+            counted = (pd.to_numeric(df['quote_id'], errors='coerce') <= self.last_quote_id).to_numpy() & (vendor['quote_count'] > 0)
+            vendor['quote_count'] = vendor['quote_count'] - counted
+
+        df = df.copy()
+        for name, values in _features(vendor, by_type).items():
+            df[name] = values
+        return df
+
+    def save(self, stats_dir=STATS_DIR):
+        os.makedirs(stats_dir, exist_ok=True)
+        self.table.reset_index().to_parquet(os.path.join(stats_dir, STATS_FILE), index=False)
+        state = {'last_quote_id': self.last_quote_id, 'last_actual_id': self.last_actual_id}
+        tmp_path = os.path.join(stats_dir, STATE_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, os.path.join(stats_dir, STATE_FILE))
+
+    @classmethod
+    def load(cls, stats_dir=STATS_DIR):
+        with open(os.path.join(stats_dir, STATE_FILE)) as f:
+            state = json.load(f)
+        table = pd.read_parquet(os.path.join(stats_dir, STATS_FILE)).set_index(['vendor_id', 'project_type'])
+        return cls(table, **state)
+
+def stats_signature(stats_dir=STATS_DIR):
+    """(mtime, size) of the saved stats files, or None if there are none. Cheap enough to check per request."""
+    signature = []
+    for name in (STATS_FILE, STATE_FILE):
+        try:
+            stat = os.stat(os.path.join(stats_dir, name))
+        except FileNotFoundError:
+            return None
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def _days(dates):
+    """Dates as int64 days since the epoch, with -1 for missing dates."""
+    dates = pd.to_datetime(pd.Series(np.asarray(dates, dtype=object)), errors='coerce')
+    return np.where(dates.notna(), dates.to_numpy('datetime64[D]').astype(np.int64), -1)
+
+def _sums_before(event_keys, event_days, event_values, query_keys, query_days):
+    """
+    For every query, the column sums of event_values over the events with the same
+    key (a list of key arrays) on a strictly earlier day. One sort of the events and
+    two searchsorted calls, so this is O((events + queries) log events).
+    """
+    num_events = len(event_days)
+    keys = pd.MultiIndex.from_arrays([np.concatenate([e, q]) for e, q in zip(event_keys, query_keys)])
+    codes, _ = keys.factorize()
+    event_codes, query_codes = codes[:num_events].astype(np.int64), codes[num_events:].astype(np.int64)
+
+    # (key, day) packed into one sortable int64
+    first_day = min(event_days.min(initial=0), 0)
+    span = int(max(event_days.max(initial=0), query_days.max(initial=0)) - first_day + 2)
+    event_order = event_codes * span + (event_days - first_day)
+    order = np.argsort(event_order, kind='stable')
+    cumulative = np.vstack([np.zeros((1, event_values.shape[1])), np.cumsum(event_values[order], axis=0)])
+    sorted_events = event_order[order]
+    start = np.searchsorted(sorted_events, query_codes * span, side='left')
+    end = np.searchsorted(sorted_events, query_codes * span + np.clip(query_days - first_day, 0, span - 1), side='left')
+    return cumulative[end] - cumulative[start]
+
+def historical_features(merged, projects_df, quotes_df, actuals_df):
+    """
+    Returns the merged training frame with the VENDOR_FEATURES columns as they were
+    when each quote was made (its project's start_date): only quotes of projects
+    started before that day and outcomes of projects completed (end_date) before it
+    count. A row therefore never sees its own quote, its own outcome or anything
+    later, which is what VendorStats.add_features gives a new quote at serving time.
+    Rows without a valid vendor_id or start_date get NaN.
+    """
+    quoted = merge_data(projects_df, quotes_df, actuals_df, columns=['vendor_id', 'project_type', 'start_date'], completed_only=False)
+    winners = winning_quotes(merge_data(projects_df, quotes_df, actuals_df, columns=[
+        'project_id', 'vendor_id', 'project_type', 'end_date', 'quoted_hours', 'actual_contract_price', 'actual_effort_hours']))
+    ratio = _ratio(winners['quoted_hours'], winners['actual_effort_hours'])
+    has_ratio = ~np.isnan(ratio)
+    # Sums of squares are taken around the overall mean for numerical stability
+    shift = float(np.nanmean(ratio)) if has_ratio.any() else 0.0
+    centered = np.where(has_ratio, ratio - shift, 0.0)
+
+    # Events: one per quote (counted from its project's start) and one per win
+    # (counted from the project's completion); columns quote, win, n, sum, sum of squares
+    event_vendors = np.concatenate([_vendor_array(quoted['vendor_id']), _vendor_array(winners['vendor_id'])])
+    event_types = np.concatenate([quoted['project_type'].astype(str).to_numpy(dtype=object),
+                                  winners['project_type'].astype(str).to_numpy(dtype=object)])
+    event_days = np.concatenate([_days(quoted['start_date']), _days(winners['end_date'])])
+    num_quotes = len(quoted)
+    event_values = np.zeros((len(event_days), 5))
+    event_values[:num_quotes, 0] = 1
+    event_values[num_quotes:, 1] = 1
+    event_values[num_quotes:, 2] = has_ratio
+    event_values[num_quotes:, 3] = centered
+    event_values[num_quotes:, 4] = centered ** 2
+    valid = ~np.isnan(event_vendors) & (event_days >= 0)
+    event_vendors, event_types, event_days, event_values = (
+        event_vendors[valid].astype(np.int64), event_types[valid], event_days[valid], event_values[valid])
+
+    query_vendors = _vendor_array(merged['vendor_id'])
+    query_days = _days(merged['start_date'])
+    known = ~np.isnan(query_vendors) & (query_days >= 0)
+    query_vendors = np.where(known, query_vendors, -1).astype(np.int64)
+    query_types = merged['project_type'].astype(str).to_numpy(dtype=object)
+
+    levels = {}
+    for level, event_keys, query_keys in [
+        ('vendor', [event_vendors], [query_vendors]),
+        ('by_type', [event_vendors, event_types], [query_vendors, query_types]),
+    ]:
+        sums = _sums_before(event_keys, event_days, event_values, query_keys, query_days)
+        sums[~known] = 0
+        n, s1, s2 = sums[:, 2], sums[:, 3], sums[:, 4]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            levels[level] = {
+                'quote_count': sums[:, 0],
+                'win_count': sums[:, 1],
+                'ratio_count': n,
+                'ratio_mean': shift + s1 / n,
+                'ratio_m2': s2 - s1 ** 2 / n,
+            }
+
+    merged = merged.copy()
+    for name, values in _features(levels['vendor'], levels['by_type']).items():
+        merged[name] = np.where(known, values, np.nan).astype(np.float32)
+    return merged
+
+def update_saved_stats(projects_df, quotes_df, actuals_df, stats_dir=STATS_DIR, rebuild=False):
+    """
+    Loads the vendor stats in stats_dir (or starts new ones), folds in the quotes and
+    actuals of the given source tables that arrived since their last update and saves
+    them again.
+
+    Returns:
+        tuple: (VendorStats, new quotes counted, new actuals counted)
+    """
+    if rebuild or not os.path.exists(os.path.join(stats_dir, STATE_FILE)):
+        stats = VendorStats()
+    else:
+        stats = VendorStats.load(stats_dir)
+    num_quotes, num_actuals = stats.update(projects_df, quotes_df, actuals_df)
+    stats.save(stats_dir)
+    return stats, num_quotes, num_actuals
+
+def update_vendor_stats(data_path=".", stats_dir=STATS_DIR, rebuild=False):
+    """
+    Brings the vendor stats in stats_dir up to date with the CSV files in data_path,
+    adding only the quotes and actuals that arrived since the last update.
+
+    Returns:
+        VendorStats: The updated stats, or None if the CSV files are missing.
+    """
+    projects, _, quotes, actuals = load_data(data_path)
+    if projects is None:
+        return None
+    stats, num_quotes, num_actuals = update_saved_stats(projects, quotes, actuals, stats_dir, rebuild)
+    logger.info(f"Vendor stats updated with {num_quotes} new quotes and {num_actuals} new actuals "
+                f"({stats.table.index.get_level_values('vendor_id').nunique()} vendors).")
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Updates the precomputed vendor aggregate features.")
+    parser.add_argument('--data', default=".", help="Directory containing the source CSV files.")
+    parser.add_argument('--stats-dir', default=STATS_DIR, help="Where the vendor stats are kept.")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute the stats from scratch.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    update_vendor_stats(args.data, args.stats_dir, args.rebuild)